@@ -0,0 +1,94 @@
+import argparse
+import itertools
+import sys
+import chess
+import numpy as np
+from evaluation import PIECE_SQUARE_SCORES
+
+# Batch evaluation for offline jobs (scoring positions from game logs, tuning): positions
+# are encoded as 12 piece planes of 64 squares and the material + piece-square score of
+# all of them comes out of one matrix product with the piece-square weights. The scores
+# are the static part of evaluate_board, i.e. material_score() / Position.score.
+#
+#   python batch_eval.py positions.epd > scores.txt
+
+# Plane of every piece, White pawn..king then Black pawn..king
+PLANES = [(color, piece_type) for color in (chess.WHITE, chess.BLACK) for piece_type in chess.PIECE_TYPES]
+
+# Signed White-relative score of a piece on a square, flattened to plane * 64 + square
+WEIGHTS = np.array([PIECE_SQUARE_SCORES[color][piece_type][square]
+                    for color, piece_type in PLANES for square in chess.SQUARES], dtype=np.int32)
+
+DEFAULT_BATCH_SIZE = 4096
+
+# FEN piece letter to plane
+FEN_PLANES = {chess.Piece(piece_type, color).symbol(): plane
+              for plane, (color, piece_type) in enumerate(PLANES)}
+
+
+# Function to get the 12 piece bitboards of a FEN (only the placement field is read)
+def fen_bitboards(fen):
+    bitboards = [0] * 12
+    square = 56
+    for char in fen.split(" ", 1)[0]:
+        if char == "/":
+            square -= 16
+        elif char.isdigit():
+            square += int(char)
+        else:
+            bitboards[FEN_PLANES[char]] |= 1 << square
+            square += 1
+    return bitboards
+
+
+# Function to get the 12 piece bitboards of a chess.Board, a position.Position or a FEN
+def bitboards(item):
+    if isinstance(item, str):
+        return fen_bitboards(item)
+    if isinstance(item, chess.Board):
+        white, black = item.occupied_co[chess.WHITE], item.occupied_co[chess.BLACK]
+        pieces = (item.pawns, item.knights, item.bishops, item.rooks, item.queens, item.kings)
+        return [mask & white for mask in pieces] + [mask & black for mask in pieces]
+    return [item.pieces_mask(piece_type, color) for color, piece_type in PLANES]
+
+
+# Function to encode positions as an (n, 12, 64) array of 0/1 piece planes
+def encode(items):
+    return encode_bitboards(np.array([bitboards(item) for item in items], dtype=np.uint64).reshape(-1, 12))
+
+
+# Function to unpack an (n, 12) array of piece bitboards into (n, 12, 64) piece planes
+def encode_bitboards(masks):
+    # Little-endian bytes with little bit order put square 0 first
+    planes = np.unpackbits(masks.astype("<u8").view(np.uint8), axis=1, bitorder="little")
+    return planes.reshape(-1, 12, 64)
+
+
+# Function to evaluate a list of positions at once, returns an int array of White-relative scores
+def evaluate_batch(items):
+    planes = encode(items)
+    return planes.reshape(len(planes), 12 * 64).astype(np.int32) @ WEIGHTS
+
+
+# Function to evaluate a stream of positions of any length, batch by batch
+def evaluate_stream(items, batch_size=DEFAULT_BATCH_SIZE):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, batch_size))
+        if not batch:
+            return
+        yield from evaluate_batch(batch).tolist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Static scores of FEN or EPD positions, one per line")
+    parser.add_argument("path", nargs="?", help="input file, standard input when left out")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    lines = open(args.path) if args.path else sys.stdin
+    with lines:
+        fens = (line.strip() for line in lines if line.strip() and not line.startswith("#"))
+        fens, output = itertools.tee(fens)
+        for fen, score in zip(output, evaluate_stream(fens, args.batch_size)):
+            print(f"{score}\t{fen}")
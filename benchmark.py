@@ -0,0 +1,207 @@
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import chess
+import chess_ai
+import parallel_search
+from position import Position
+from transposition import TranspositionTable
+
+# Fixed positions so runs can be compared with each other
+BENCH_POSITIONS = {
+    "opening": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "italian": "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "middlegame": "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10",
+    "middlegame_open": "r1b2rk1/2q1bppp/p2ppn2/1p6/3NP3/1BN5/PPP2PPP/R2Q1RK1 w - - 0 12",
+    "endgame": "8/5pk1/6p1/8/3R4/6P1/5PKP/3r4 w - - 0 40",
+    "endgame_pawns": "8/8/1p1k4/p1p5/P1P2K2/1P6/8/8 w - - 0 50",
+    "tactical": "2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1",
+    "tactical_mate": "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4",
+}
+
+DEFAULT_DEPTH = 4
+
+# Search techniques that can be switched off (keyword arguments of chess_ai.Search)
+FEATURES = ("pvs", "null_move", "late_move_reductions", "check_extensions", "aspiration")
+
+# Metrics where a higher value is better; for the others (times, nodes) lower is better
+HIGHER_IS_BETTER = ("nps", "evaluate_board_per_sec", "evaluate_position_per_sec", "order_moves_per_sec")
+
+
+def time_to_depth(fen, depth, workers=1):
+    # Seconds and nodes needed to finish the given depth from a cold table
+    board = chess.Board(fen)
+    if workers > 1:
+        # Fresh worker processes so no table is warm, started before the clock runs
+        parallel_search.shutdown_pool()
+        parallel_search.get_pool(workers)
+    search = chess_ai.Search()
+    start = time.perf_counter()
+    chess_ai.iterative_deepening(board, depth, tt=TranspositionTable(), search=search, workers=workers)
+    return time.perf_counter() - start, search.nodes
+
+
+def parallel_speedup(depths=(4, 5, 6), workers=4, positions=BENCH_POSITIONS):
+    # Prints time-to-depth of the serial and the parallel search for every position
+    print(f"{'position':<16}{'depth':>6}{'serial s':>10}{f'{workers} workers s':>14}{'speedup':>9}")
+    for name, fen in positions.items():
+        for depth in depths:
+            serial, _ = time_to_depth(fen, depth)
+            parallel, _ = time_to_depth(fen, depth, workers)
+            print(f"{name:<16}{depth:>6}{serial:>10.2f}{parallel:>14.2f}{serial / parallel:>9.2f}")
+    parallel_search.shutdown_pool()
+
+
+def bench_search(fen, depth, memory=True, options=None):
+    # Iterative deepening from a cold table, timing every depth
+    # options are passed on to Search, e.g. {"null_move": False}
+    search = chess_ai.Search(**(options or {}))
+    chess_ai.iterative_deepening(chess.Board(fen), depth, tt=TranspositionTable(), search=search)
+    last = search.iterations[-1]
+    result = {
+        "fen": fen,
+        "depth": depth,
+        "nodes": last.nodes,
+        "qnodes": last.qnodes,
+        "evals": last.evals,
+        "seconds": round(last.elapsed, 4),
+        "nps": last.nps,
+        "time_to_depth": [round(stats.elapsed, 4) for stats in search.iterations],
+        "nodes_per_depth": [stats.iteration_nodes for stats in search.iterations],
+        "branching_factor": round(last.branching_factor, 2),
+        "first_move_cutoff_rate": round(last.first_move_cutoff_rate, 3),
+        "tt_hit_rate": round(last.tt_hit_rate, 3),
+    }
+    if memory:
+        # Separate run, tracing allocations slows the search down too much to time it
+        tracemalloc.start()
+        chess_ai.iterative_deepening(chess.Board(fen), depth, tt=TranspositionTable(),
+                                     search=chess_ai.Search(**(options or {})))
+        result["peak_memory_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return result
+
+
+def feature_savings(depth=DEFAULT_DEPTH, positions=BENCH_POSITIONS):
+    # Prints total nodes and time with every search technique on, then with each one off
+    print(f"{'switched off':<22}{'nodes':>10}{'seconds':>10}{'nodes saved':>13}")
+    for feature in (None,) + FEATURES:
+        options = {feature: False} if feature else {}
+        results = [bench_search(fen, depth, False, options) for fen in positions.values()]
+        nodes = sum(result["nodes"] for result in results)
+        seconds = sum(result["seconds"] for result in results)
+        if feature is None:
+            all_nodes = nodes
+            print(f"{'nothing':<22}{nodes:>10}{seconds:>10.2f}")
+        else:
+            # What the technique saves: the extra nodes needed without it
+            print(f"{feature:<22}{nodes:>10}{seconds:>10.2f}{1 - all_nodes / nodes:>13.1%}")
+
+
+def calls_per_second(function, args_list, min_time=0.5):
+    # Calls function over args_list repeatedly for at least min_time seconds
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for args in args_list:
+            function(*args)
+        calls += len(args_list)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return round(calls / elapsed)
+
+
+def bench_evaluation(positions=BENCH_POSITIONS):
+    boards = [chess.Board(fen) for fen in positions.values()]
+    positions = [Position.from_board(board) for board in boards]
+    return {
+        "evaluate_board_per_sec": calls_per_second(chess_ai.evaluate_board, [(board,) for board in boards]),
+        "evaluate_position_per_sec": calls_per_second(chess_ai.evaluate_position, [(pos,) for pos in positions]),
+        "order_moves_per_sec": calls_per_second(chess_ai.order_moves, [(pos, pos.legal_moves()) for pos in positions]),
+    }
+
+
+def run_benchmark(depth=DEFAULT_DEPTH, positions=BENCH_POSITIONS, memory=True, options=None):
+    results = {"depth": depth, "positions": {}}
+    if options:
+        results["options"] = options
+    for name, fen in positions.items():
+        results["positions"][name] = bench_search(fen, depth, memory, options)
+    nodes = sum(result["nodes"] for result in results["positions"].values())
+    seconds = sum(result["seconds"] for result in results["positions"].values())
+    results["totals"] = {"nodes": nodes, "seconds": round(seconds, 4), "nps": round(nodes / seconds) if seconds else 0}
+    results["evaluation"] = bench_evaluation(positions)
+    return results
+
+
+def print_results(results):
+    print(f"{'position':<16}{'nodes':>10}{'qnodes':>10}{'seconds':>10}{'nps':>10}{'ebf':>7}{'cut1':>7}{'peak KB':>10}")
+    for name, result in results["positions"].items():
+        print(f"{name:<16}{result['nodes']:>10}{result['qnodes']:>10}{result['seconds']:>10.2f}"
+              f"{result['nps']:>10}{result['branching_factor']:>7.2f}{result['first_move_cutoff_rate']:>7.0%}"
+              f"{result.get('peak_memory_kb', '-'):>10}")
+    totals = results["totals"]
+    print(f"{'total':<16}{totals['nodes']:>10}{'':>10}{totals['seconds']:>10.2f}{totals['nps']:>10}")
+    for name, value in results["evaluation"].items():
+        print(f"{name}: {value}")
+
+
+def compare(results, baseline, threshold):
+    # Returns messages for every metric that got worse than the baseline by more than threshold
+    regressions = []
+
+    def check(label, name, value, old):
+        if not old or name not in HIGHER_IS_BETTER + ("nodes", "seconds"):
+            return
+        change = (value - old) / old
+        if (change < -threshold) if name in HIGHER_IS_BETTER else (change > threshold):
+            regressions.append(f"{label} {name}: {old} -> {value} ({change:+.1%})")
+
+    for position, result in results["positions"].items():
+        old = baseline.get("positions", {}).get(position)
+        if old is None or old.get("depth") != result["depth"]:
+            continue
+        for name in ("nodes", "seconds", "nps"):
+            check(position, name, result[name], old.get(name))
+    for name, value in results["evaluation"].items():
+        check("evaluation", name, value, baseline.get("evaluation", {}).get(name))
+    check("total", "nps", results["totals"]["nps"], baseline.get("totals", {}).get("nps"))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chess engine benchmarks")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    parser.add_argument("--parallel", type=int, metavar="WORKERS",
+                        help="compare serial and parallel time-to-depth instead")
+    parser.add_argument("--depths", type=int, nargs="+", default=[4, 5, 6], help="depths for --parallel")
+    parser.add_argument("--disable", nargs="+", choices=FEATURES, default=[], help="search techniques to switch off")
+    parser.add_argument("--features", action="store_true",
+                        help="measure the nodes each search technique saves instead")
+    args = parser.parse_args()
+
+    if args.parallel:
+        parallel_speedup(args.depths, args.parallel)
+        sys.exit(0)
+    if args.features:
+        feature_savings(args.depth)
+        sys.exit(0)
+    results = run_benchmark(args.depth, memory=not args.no_memory, options={name: False for name in args.disable})
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for message in regressions:
+            print("REGRESSION", message)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
@@ -0,0 +1,113 @@
+import argparse
+import os
+import random
+import struct
+import chess
+import chess.pgn
+import chess.polyglot
+
+# Polyglot opening books. Lookups use python-chess' memory-mapped reader, which binary
+# searches the entries (sorted on the Zobrist key) without loading the file into memory.
+# build_book() writes a book from a PGN collection, reading one game at a time:
+#
+#   python book.py games.pgn assets/book.bin --plies 16 --min-games 2
+
+DEFAULT_BOOK = os.path.join("assets", "book.bin")
+
+# Polyglot entry: key, move, weight, learn; big-endian, 16 bytes
+ENTRY = struct.Struct(">QHHI")
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    """Polyglot book opened as a memory map. A missing file gives an empty book.
+
+    choose() picks a book move at random, weighted by the entry weights, or returns
+    None when the position is not in the book.
+    """
+
+    def __init__(self, path=DEFAULT_BOOK, min_weight=1, seed=None):
+        self.path = path
+        self.min_weight = min_weight
+        self.random = random.Random(seed)
+        self.reader = chess.polyglot.open_reader(path) if os.path.exists(path) else None
+
+    def moves(self, board):
+        # (move, weight) of every book move for the board
+        if self.reader is None:
+            return []
+        return [(entry.move, entry.weight) for entry in self.reader.find_all(board, minimum_weight=self.min_weight)]
+
+    def choose(self, board):
+        moves = self.moves(board)
+        if not moves:
+            return None
+        return self.random.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+
+# Function to encode a move the Polyglot way, castling is written as the king taking its own rook
+def polyglot_move(board, move):
+    to_square = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if chess.square_file(to_square) > chess.square_file(move.from_square) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | move.from_square << 6 | promotion << 12
+
+
+# Function to build a Polyglot book from the first max_plies moves of every game in a PGN file.
+# A move gets 2 points for a win of the side playing it and 1 for a draw; moves seen in fewer
+# than min_games games are left out. Returns (games read, entries written).
+def build_book(pgn_path, book_path, max_plies=16, min_games=1):
+    stats = {}  # zobrist key -> {encoded move: [points, games]}
+    games = 0
+    with open(pgn_path, encoding="utf-8", errors="replace") as pgn:
+        while True:
+            game = chess.pgn.read_game(pgn)
+            if game is None:
+                break
+            games += 1
+            result = game.headers.get("Result", "*")
+            board = game.board()
+            for ply, move in enumerate(game.mainline_moves()):
+                if ply >= max_plies:
+                    break
+                if result == "1/2-1/2":
+                    points = 1
+                elif result in ("1-0", "0-1"):
+                    points = 2 if (result == "1-0") == (board.turn == chess.WHITE) else 0
+                else:
+                    points = 1  # unfinished or unknown result
+                entry = stats.setdefault(chess.polyglot.zobrist_hash(board), {}).setdefault(
+                    polyglot_move(board, move), [0, 0])
+                entry[0] += points
+                entry[1] += 1
+                board.push(move)
+
+    entries = [(key, move, points) for key, moves in stats.items()
+               for move, (points, count) in moves.items() if count >= min_games and points > 0]
+    # Weights only have 16 bits, scale down if a move was played too often
+    top = max((points for _, _, points in entries), default=0)
+    scale = min(1.0, MAX_WEIGHT / top) if top else 1.0
+    entries.sort()
+    with open(book_path, "wb") as f:
+        for key, move, points in entries:
+            f.write(ENTRY.pack(key, move, max(1, int(points * scale)), 0))
+    return games, len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Polyglot opening book from a PGN file")
+    parser.add_argument("pgn")
+    parser.add_argument("book", nargs="?", default=DEFAULT_BOOK)
+    parser.add_argument("--plies", type=int, default=16, help="book depth in plies")
+    parser.add_argument("--min-games", type=int, default=1, help="leave out moves played in fewer games")
+    args = parser.parse_args()
+
+    games, written = build_book(args.pgn, args.book, args.plies, args.min_games)
+    print(f"{games} games, {written} entries written to {args.book}")
@@ -1,5 +1,252 @@
 import chess
+import math
 import random
+import time
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from timecontrol import SearchLimits
+from evaluation import PIECE_VALUES, PIECE_SQUARE_SCORES
+from position import Position, decode_move
+from tablebase import TABLEBASE, TB_WIN_SCORE
+
+# Shared by every search in the process so results carry over between iterations and moves
+TRANSPOSITION_TABLE = TranspositionTable()
+
+MAX_DEPTH = 64
+
+# How often (in nodes) the search looks at the clock and the stop flag
+CHECK_INTERVAL = 1024
+
+# Move ordering scores: hash move > captures > killer moves > history of quiet moves
+HASH_MOVE_SCORE = 3000000
+CAPTURE_SCORE = 2000000
+KILLER_SCORE = 1000000
+HISTORY_LIMIT = 500000
+
+# Bound wider than any score, the search works with integer windows
+INFINITE = 1000000
+
+# Null-move pruning: depth reduction of the null-move search and the least depth it is tried at
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+
+# Late-move reductions: quiet moves from this index on are searched shallower at this depth or more,
+# never at PV nodes. Below depth 6 (the GUI searches to depth 5) reductions missed too many tactics
+LMR_MIN_INDEX = 3
+LMR_MIN_DEPTH = 6
+LMR_REDUCTIONS = [[0] * 256] + [[0] + [int(0.75 + math.log(depth) * math.log(index) / 2.25) for index in range(1, 256)]
+                                for depth in range(1, MAX_DEPTH + 2)]
+
+# Aspiration windows: half width of the first window around the previous score, from this depth on
+ASPIRATION_WINDOW = 50
+ASPIRATION_MIN_DEPTH = 4
+
+
+class SearchAborted(Exception):
+    # Raised inside the tree when the search runs out of time or nodes, or is stopped
+    pass
+
+
+class Search:
+    """State of one root search: limits, clock, node counter and move ordering tables.
+
+    stop() may be called from another thread, the search then unwinds at the
+    next check and iterative_deepening returns the last completed result.
+    Killer moves and the history table live as long as the Search object, so
+    every iteration of iterative deepening starts from what the previous ones learned.
+    The pruning and extension techniques can be switched off one by one to measure
+    what each of them saves (see benchmark.py --features).
+    """
+
+    def __init__(self, limits=None, pvs=True, null_move=True, late_move_reductions=True,
+                 check_extensions=True, aspiration=True):
+        self.limits = limits or SearchLimits()
+        self.pvs = pvs
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.check_extensions = check_extensions
+        self.aspiration = aspiration
+        self.nodes = 0
+        self.qnodes = 0  # nodes searched by quiescence, also counted in nodes
+        self.evals = 0  # static evaluations at leaves and quiescence nodes
+        self.aspiration_researches = 0  # root searches repeated with a wider window
+        self.tb_hits = 0  # positions scored by the endgame tablebases
+        self.stopped = False
+        self.start_time = time.perf_counter()
+        self.soft_limit = None
+        self.hard_limit = None
+        self.next_check = CHECK_INTERVAL
+        # Result of the last completed iteration, readable while the search runs
+        self.completed_depth = 0
+        self.best_score = None
+        self.best_move = None
+        # Move ordering: two quiet moves per ply that caused a cutoff, and a
+        # [color][from][to] score of how often quiet moves caused cutoffs
+        self.killers = [[] for _ in range(MAX_DEPTH + 1)]
+        self.history = [0] * (2 * 64 * 64)
+        self.root_ply = 0
+        # Beta cutoffs and how many of them came from the first move searched
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # SearchStats of every completed iteration
+        self.iterations = []
+        self.tt = None
+        self.tt_hits_start = 0
+        self.tt_probes_start = 0
+        self.iteration_start = (0.0, 0)
+
+    def start(self, pos, tt=None):
+        self.start_time = time.perf_counter()
+        self.soft_limit, self.hard_limit = self.limits.budget(pos.turn)
+        self.next_check = CHECK_INTERVAL
+        self.root_ply = pos.ply
+        self.tt = tt
+        if tt is not None:
+            self.tt_hits_start = tt.hits
+            self.tt_probes_start = tt.hits + tt.misses
+
+    def begin_iteration(self):
+        self.iteration_start = (self.elapsed(), self.nodes)
+
+    def end_iteration(self, depth, score, pv):
+        # Records the statistics of a completed iteration and returns them
+        start_time, start_nodes = self.iteration_start
+        elapsed = self.elapsed()
+        iteration_nodes = max(1, self.nodes - start_nodes)
+        previous_nodes = self.iterations[-1].iteration_nodes if self.iterations else 1
+        tt_hits = tt_probes = 0
+        if self.tt is not None:
+            tt_hits = self.tt.hits - self.tt_hits_start
+            tt_probes = self.tt.hits + self.tt.misses - self.tt_probes_start
+        stats = SearchStats(
+            depth=depth,
+            score=score,
+            pv=pv,
+            nodes=self.nodes,
+            qnodes=self.qnodes,
+            evals=self.evals,
+            tb_hits=self.tb_hits,
+            iteration_nodes=iteration_nodes,
+            iteration_seconds=elapsed - start_time,
+            branching_factor=iteration_nodes / previous_nodes,
+            elapsed=elapsed,
+            cutoffs=self.cutoffs,
+            first_move_cutoff_rate=self.first_move_cutoff_rate(),
+            tt_hits=tt_hits,
+            tt_hit_rate=tt_hits / tt_probes if tt_probes else 0.0,
+        )
+        self.iterations.append(stats)
+        self.completed_depth = depth
+        self.best_score = score
+        self.best_move = pv[0] if pv else None
+        return stats
+
+    def ply(self, pos):
+        return min(pos.ply - self.root_ply, MAX_DEPTH)
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def record_cutoff(self, pos, move, depth, index):
+        # Called on a beta cutoff, quiet moves are remembered as killers and in the history
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        if move >> 12 or pos.is_capture(move):
+            return
+        killers = self.killers[self.ply(pos)]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        i = history_index(pos.turn, move)
+        self.history[i] += depth * depth
+        if self.history[i] >= HISTORY_LIMIT:
+            # Keep history scores below the killer moves by halving the whole table
+            self.history = [value // 2 for value in self.history]
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def stop(self):
+        self.stopped = True
+
+    def set_limits(self, limits, turn):
+        # Replaces the limits of a running search, the clock starts again from now
+        # (a ponder search becoming a normal one)
+        self.limits = limits
+        self.start_time = time.perf_counter()
+        self.soft_limit, self.hard_limit = limits.budget(turn)
+
+    def check(self):
+        # Called on every node, only does real work every CHECK_INTERVAL nodes
+        self.nodes += 1
+        if self.nodes < self.next_check:
+            return
+        self.next_check = self.nodes + CHECK_INTERVAL
+        if self.stopped:
+            raise SearchAborted()
+        if self.limits.nodes is not None and self.nodes >= self.limits.nodes:
+            raise SearchAborted()
+        if self.hard_limit is not None and self.elapsed() >= self.hard_limit:
+            raise SearchAborted()
+
+    def should_stop_iterating(self, stats):
+        # Called after every completed depth with its SearchStats: True when the search was
+        # stopped, used up its node limit, or the next depth is not expected to fit in the
+        # soft time limit (its cost predicted from the branching factor seen so far)
+        if self.stopped:
+            return True
+        if self.limits.nodes is not None and self.nodes >= self.limits.nodes:
+            return True
+        if self.soft_limit is None:
+            return False
+        iteration_nodes = [iteration.iteration_nodes for iteration in self.iterations]
+        next_nodes = predict_next_nodes(iteration_nodes)
+        return self.elapsed() + stats.iteration_seconds * next_nodes / iteration_nodes[-1] > self.soft_limit
+
+class SearchStats:
+    """What the engine did up to the end of one iterative-deepening iteration.
+
+    Counters (nodes, qnodes, evals, tb_hits, cutoffs, tt_hits) are totals since the start of
+    the search, iteration_nodes and iteration_seconds cover this iteration only.
+    branching_factor is the effective branching factor, the nodes of this iteration
+    divided by those of the previous one. pv is the principal variation as a list of
+    chess.Move.
+    """
+
+    def __init__(self, depth, score, pv, nodes, qnodes, evals, tb_hits, iteration_nodes, iteration_seconds,
+                 branching_factor, elapsed, cutoffs, first_move_cutoff_rate, tt_hits, tt_hit_rate):
+        self.depth = depth
+        self.score = score
+        self.pv = pv
+        self.nodes = nodes
+        self.qnodes = qnodes
+        self.evals = evals
+        self.tb_hits = tb_hits
+        self.iteration_nodes = iteration_nodes
+        self.iteration_seconds = iteration_seconds
+        self.branching_factor = branching_factor
+        self.elapsed = elapsed
+        self.cutoffs = cutoffs
+        self.first_move_cutoff_rate = first_move_cutoff_rate
+        self.tt_hits = tt_hits
+        self.tt_hit_rate = tt_hit_rate
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.elapsed) if self.elapsed > 0 else 0
+
+    def as_dict(self):
+        values = {name: getattr(self, name) for name in (
+            "depth", "score", "nodes", "qnodes", "evals", "tb_hits", "iteration_nodes", "iteration_seconds",
+            "elapsed", "cutoffs", "first_move_cutoff_rate", "tt_hits", "tt_hit_rate", "nps", "branching_factor")}
+        values["pv"] = [move.uci() for move in self.pv]
+        return values
+
+    def __str__(self):
+        return (f"depth {self.depth} score {self.score} nodes {self.nodes} qnodes {self.qnodes} "
+                f"nps {self.nps} ebf {self.branching_factor:.2f} cutoff1 {self.first_move_cutoff_rate:.0%} "
+                f"tthits {self.tt_hits} time {self.elapsed:.2f} pv {' '.join(move.uci() for move in self.pv)}")
+
 
 def random_agent(board):
     # Select a random legal move from the board
@@ -9,47 +256,248 @@ def random_agent(board):
     return random.choice(moves)
 
 
-def alpha_beta_minimax(board, depth, alpha, beta, maximizing_player):
-    if depth == 0 or board.is_game_over(): #base case for recursion
-        return evaluate_board(board), None
+def alpha_beta_minimax(board, depth, alpha, beta, maximizing_player, tt=None, search=None):
+    # Minimax interface kept on top of negamax(): scores are from White's point of view and
+    # maximizing_player says whether White is to move. A chess.Board is converted first and
+    # the best move handed back as a chess.Move
+    pos = board if isinstance(board, Position) else Position.from_board(board)
+    if search is None:
+        search = Search()
+        search.start(pos, tt)
+    alpha, beta = max(alpha, -INFINITE), min(beta, INFINITE)
+    if maximizing_player:
+        value, move = negamax(pos, depth, alpha, beta, tt, search)
+    else:
+        value, move = negamax(pos, depth, -beta, -alpha, tt, search)
+        value = -value
+    if pos is not board:
+        move = decode_move(move) if move else None
+    return value, move
+
+# Function to search a position with negamax alpha-beta, scores are from the side to move's
+# point of view. Returns (score, best move as an int). Search.check() counts the node and
+# raises SearchAborted once the limits are hit.
+# The first move of every node is searched with the full window and the others with a
+# zero window, re-searched only when they beat alpha (principal variation search). Quiet
+# late moves outside the PV are searched shallower first (late-move reductions), positions far enough
+# above beta are cut after passing the move (null-move pruning), and checks are extended.
+def negamax(pos, depth, alpha, beta, tt, search, allow_null=True):
+    search.check()
+    sign = 1 if pos.turn == chess.WHITE else -1
+    if pos.ply > search.root_ply:
+        # Draws, all without generating moves: repetition, insufficient material and the
+        # fifty-move rule (unless the last move mated). Checkmate and stalemate follow from
+        # the move list generated below.
+        if pos.is_repeated(search.root_ply) or pos.is_insufficient_material():
+            return 0, None
+        if pos.halfmove_clock >= 100 and not (pos.is_check() and not pos.has_legal_moves()):
+            return 0, None
+    # Positions in the endgame tablebases have an exact score and need no search. Only
+    # probed right after a capture or pawn move, the tables assume a fresh fifty-move count.
+    # The root is always searched, it has to come up with a move when root_move() could not
+    if (TABLEBASE.max_pieces and pos.ply > search.root_ply and pos.halfmove_clock == 0
+            and TABLEBASE.can_probe(pos)):
+        tb_score = TABLEBASE.score(pos)
+        if tb_score is not None:
+            search.tb_hits += 1
+            return sign * tb_score, None
+    in_check = pos.is_check()
+    if in_check and search.check_extensions and pos.ply - search.root_ply < MAX_DEPTH:
+        depth += 1
+    if depth <= 0:
+        # Resolve pending captures before trusting the static evaluation
+        return quiescence(pos, alpha, beta, search), None
+
+    # Transposition table lookup: reuse results of positions already searched deep enough
+    key = pos.key
+    hash_move = None
+    alpha_orig = alpha
+    if tt is not None:
+        entry = tt.probe(key)
+        if entry is not None:
+            _, entry_depth, flag, entry_score, hash_move, _ = entry
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return entry_score, hash_move
+                elif flag == LOWER:
+                    alpha = max(alpha, entry_score)
+                elif flag == UPPER:
+                    beta = min(beta, entry_score)
+                if beta <= alpha:
+                    return entry_score, hash_move
 
-    # Get all legal moves for the current player
-    legal_moves = list(board.legal_moves)
+    pv_node = beta - alpha > 1
+    # Null move: if passing still leaves the score above beta, a real move will too. Not in
+    # pawn endings, where having to move can be the problem (zugzwang), and never twice in a row
+    if (search.null_move and allow_null and not pv_node and not in_check and depth >= NULL_MOVE_MIN_DEPTH
+            and pos.ply > search.root_ply and sign * pos.score >= beta and pos.has_non_pawn_material(pos.turn)):
+        reduction = NULL_MOVE_REDUCTION + (depth > 6)
+        pos.push_null()
+        null_score = -negamax(pos, depth - 1 - reduction, -beta, -beta + 1, tt, search, False)[0]
+        pos.pop_null()
+        if null_score >= beta:
+            return beta, None
+
+    # Get all legal moves for the current player, none means checkmate or stalemate
+    legal_moves = pos.legal_moves()
     if not legal_moves:
-        return evaluate_board(board), None
+        search.evals += 1
+        return (-MATE_SCORE if in_check else 0), None
+
+    # Move ordering, the stored best move from the table is tried first
+    killers = search.killers[search.ply(pos)]
+    ordered_moves = order_moves(pos, legal_moves, hash_move, killers, search.history)
 
+    best_eval = -INFINITE
     best_move = None
+    for index, move in enumerate(ordered_moves):
+        quiet = not (move >> 12 or pos.is_capture(move))
+        pos.push(move)
+        if index == 0:
+            eval_score = -negamax(pos, depth - 1, -beta, -alpha, tt, search)[0]
+        else:
+            reduction = 0
+            if (search.late_move_reductions and not pv_node and quiet and depth >= LMR_MIN_DEPTH
+                    and index >= LMR_MIN_INDEX and not in_check and move not in killers and not pos.is_check()):
+                reduction = min(LMR_REDUCTIONS[depth][min(index, 255)], depth - 2)
+            if search.pvs:
+                # Zero window: only has to prove the move is no better than alpha
+                eval_score = -negamax(pos, depth - 1 - reduction, -alpha - 1, -alpha, tt, search)[0]
+                if eval_score > alpha and reduction:
+                    eval_score = -negamax(pos, depth - 1, -alpha - 1, -alpha, tt, search)[0]
+                if alpha < eval_score < beta:
+                    eval_score = -negamax(pos, depth - 1, -beta, -alpha, tt, search)[0]
+            else:
+                eval_score = -negamax(pos, depth - 1 - reduction, -beta, -alpha, tt, search)[0]
+                if eval_score > alpha and reduction:
+                    eval_score = -negamax(pos, depth - 1, -beta, -alpha, tt, search)[0]
+        pos.pop()
+        if eval_score > best_eval:
+            best_eval = eval_score
+            best_move = move
+        if eval_score > alpha:
+            alpha = eval_score
+            if alpha >= beta:
+                search.record_cutoff(pos, move, depth, index)
+                break # Alpha-beta pruning
 
-    # Move ordering
-    ordered_moves = order_moves(board, legal_moves)
+    if tt is not None:
+        if best_eval <= alpha_orig:
+            flag = UPPER
+        elif best_eval >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        tt.store(key, depth, flag, best_eval, best_move)
+    return best_eval, best_move
 
-    if maximizing_player:
-        max_eval = float('-inf')
-        for move in ordered_moves:
-            board.push(move)
-            eval_score, _ = alpha_beta_minimax(board, depth - 1, alpha, beta, False)
-            board.pop()
-            if eval_score > max_eval:
-                max_eval = eval_score
-                best_move = move
-            alpha = max(alpha, eval_score)
-            if beta <= alpha:
-                break # Alpha-beta pruning
-        return max_eval, best_move
+
+MATE_SCORE = 99999
+
+# Piece values indexed by piece type (0 for no piece) for the capture heuristics,
+# in the static exchange evaluation the king can never be given up
+CAPTURE_VALUES = [0] + [PIECE_VALUES[piece_type] for piece_type in chess.PIECE_TYPES]
+SEE_VALUES = CAPTURE_VALUES[:chess.KING] + [20000]
+
+# Safety margin for delta pruning in quiescence search, roughly the largest positional swing of one capture
+DELTA_MARGIN = 200
+
+# Function to search captures (and check evasions) at the leaves until the position is quiet
+# The side to move may "stand pat" on the static evaluation instead of capturing
+def quiescence(pos, alpha, beta, search=None):
+    # Negamax like the main search, scores are from the side to move's point of view
+    if search is not None:
+        search.check()
+        search.qnodes += 1
+        search.evals += 1
+    if pos.is_insufficient_material():
+        return 0
+    in_check = pos.is_check()
+    if in_check:
+        # Standing pat is not allowed in check, every evasion is searched
+        moves = pos.legal_moves()
+        if not moves:
+            return -MATE_SCORE
+        moves = order_moves(pos, moves)
+        best = -INFINITE
     else:
-        min_eval = float('inf')
-        for move in ordered_moves:
-            board.push(move)
-            eval_score, _ = alpha_beta_minimax(board, depth - 1, alpha, beta, True)
-            board.pop()
-            if eval_score < min_eval:
-                min_eval = eval_score
-                best_move = move
-            beta = min(beta, eval_score)
-            if beta <= alpha: #Alpha-beta pruning
-                break
-        return min_eval, best_move
+        # Stalemate is not looked for here, it would cost a move generation at every node
+        stand_pat = static_score(pos, False)
+        if pos.turn == chess.BLACK:
+            stand_pat = -stand_pat
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        best = stand_pat
+        # Captures and queen promotions, underpromotions are left to the main search
+        moves = pos.legal_moves(captures_only=True)
+        moves.sort(key=lambda move: mvv_lva(pos, move), reverse=True)
 
+    for move in moves:
+        if not in_check:
+            # Delta pruning: even winning the captured piece cannot bring the score back into the window
+            if stand_pat + capture_value(pos, move) + DELTA_MARGIN <= alpha:
+                continue
+            # Captures that lose material in the exchange are not worth resolving
+            if not move >> 12 and static_exchange(pos, move) < 0:
+                continue
+        pos.push(move)
+        eval_score = -quiescence(pos, -beta, -alpha, search)
+        pos.pop()
+        if eval_score > best:
+            best = eval_score
+            if eval_score > alpha:
+                alpha = eval_score
+                if alpha >= beta:
+                    break
+    return best
+
+# Function to get the material a capture or promotion wins, without the piece-square terms
+def capture_value(pos, move):
+    value = CAPTURE_VALUES[pos.captured_type(move)]
+    promotion = move >> 12
+    if promotion:
+        value += CAPTURE_VALUES[promotion] - CAPTURE_VALUES[chess.PAWN]
+    return value
+
+# Function to order captures: most valuable victim first, least valuable attacker second
+def mvv_lva(pos, move):
+    return capture_value(pos, move) * 10 - SEE_VALUES[pos.mailbox[move & 63] & 7] // 100
+
+# Function to compute the static exchange evaluation of a capture: the material the side
+# to move ends up with when both sides keep recapturing on the target square with their
+# least valuable piece, and either side may stop when recapturing would lose material
+def static_exchange(pos, move):
+    from_square = move & 63
+    target = (move >> 6) & 63
+    occupied = pos.occupied ^ chess.BB_SQUARES[from_square]
+    if pos.is_en_passant(move):
+        occupied ^= chess.BB_SQUARES[target - 8 if pos.turn == chess.WHITE else target + 8]
+    gains = [SEE_VALUES[pos.captured_type(move)]]
+    on_square = pos.piece_type_at(from_square)
+    color = not pos.turn
+    while True:
+        attackers = pos.attackers_mask(color, target, occupied)
+        if not attackers:
+            break
+        for piece_type in chess.PIECE_TYPES:
+            candidates = attackers & pos.pieces_mask(piece_type, color)
+            if candidates:
+                break
+        square = chess.lsb(candidates)
+        # Gain of this recapture, assuming the opponent recaptures in turn
+        gains.append(SEE_VALUES[on_square] - gains[-1])
+        if max(-gains[-2], gains[-1]) < 0:
+            # Neither side can profit from going on, this recapture is not made
+            gains.pop()
+            break
+        on_square = piece_type
+        occupied ^= chess.BB_SQUARES[square]
+        color = not color
+    # Back up the sequence: every side may decline to continue the exchange
+    for i in range(len(gains) - 1, 0, -1):
+        gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
 
 def evaluate_board(board):
     # Evaluate the board position using a simple heuristic, Positional evaluation, Flip Arrays for Black
@@ -57,110 +505,14 @@ def evaluate_board(board):
     # Checkmate detection
     if board.is_checkmate():
         # If it's checkmate and it's our turn, we lost
-        return -99999 if board.turn == chess.WHITE else 99999
+        return -MATE_SCORE if board.turn == chess.WHITE else MATE_SCORE
     # Draw detection
     if (board.is_stalemate() or board.is_insufficient_material() or
         board.is_seventyfive_moves() or board.is_fivefold_repetition() or
         board.is_fifty_moves() or board.is_repetition()):
         return 0
 
-    piece_values = {
-        # Piece values based on standard chess evaluation, times 100 for easier calculations
-        # Bishop is usually slightly more valued than Knight
-        chess.PAWN: 100,
-        chess.KNIGHT: 320,
-        chess.BISHOP: 330,
-        chess.ROOK: 500,
-        chess.QUEEN: 900,
-        chess.KING: 0
-    }
-
-    # Piece-square tables (simplified, for White; Black is mirrored)
-    pawn_table = [# indexing is different than board, starting row for pawns is 2nd row here 
-         0,  5,  5, -10,-10,  5,  5,  0,
-         0, 10,-10,   0,  0,-10, 10,  0,
-         0, 10, 10,  20, 20, 10, 10,  0,
-         5, 20, 20,  30, 30, 20, 20,  5,
-        10, 20, 20,  40, 40, 20, 20, 10,
-        50, 50, 50,  50, 50, 50, 50, 50,
-        90, 90, 90,  90, 90, 90, 90, 90,
-         0,  0,  0,   0,  0,  0,  0,  0
-    ]
-    knight_table = [#Knights are valued more in the center of the board
-        -50,-40,-30,-30,-30,-30,-40,-50,
-        -40,-20,  0,  0,  0,  0,-20,-40,
-        -30,  0, 10, 15, 15, 10,  0,-30,
-        -30,  5, 15, 20, 20, 15,  5,-30,
-        -30,  0, 15, 20, 20, 15,  0,-30,
-        -30,  5, 10, 15, 15, 10,  5,-30,
-        -40,-20,  0,  5,  5,  0,-20,-40,
-        -50,-40,-30,-30,-30,-30,-40,-50
-    ]
-    bishop_table = [ # Bishops are generally valued more in the center of the board
-        -20,-10,-10,-10,-10,-10,-10,-20,
-        -10,  5,  0,  0,  0,  0,  5,-10,
-        -10, 10, 10, 10, 10, 10, 10,-10,
-        -10,  0, 10, 10, 10, 10,  0,-10,
-        -10,  5,  5, 10, 10,  5,  5,-10,
-        -10,  0,  5, 10, 10,  5,  0,-10,
-        -10,  0,  0,  0,  0,  0,  0,-10,
-        -20,-10,-10,-10,-10,-10,-10,-20
-    ]
-    rook_table = [ # Rooks are valued more on the 7th rank
-         0,  0,  5, 10, 10,  5,  0,  0,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-         5, 10, 10, 10, 10, 10, 10,  5,
-         0,  0,  0,  0,  0,  0,  0,  0
-    ]
-    queen_table = [
-        -20,-10,-10, -5, -5,-10,-10,-20,
-        -10,  0,  0,  0,  0,  0,  0,-10,
-        -10,  0,  5,  5,  5,  5,  0,-10,
-         -5,  0,  5,  5,  5,  5,  0, -5,
-          0,  0,  5,  5,  5,  5,  0, -5,
-        -10,  5,  5,  5,  5,  5,  0,-10,
-        -10,  0,  5,  0,  0,  0,  0,-10,
-        -20,-10,-10, -5, -5,-10,-10,-20
-    ]
-    king_table = [
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -20,-30,-30,-40,-40,-30,-30,-20,
-        -10,-20,-20,-20,-20,-20,-20,-10,
-         20, 20,  0,  0,  0,  0, 20, 20,
-         20, 30, 10,  0,  0, 10, 30, 20
-    ]
-
-    tables = { # dictionary of piece types to their respective tables
-        chess.PAWN: pawn_table,
-        chess.KNIGHT: knight_table,
-        chess.BISHOP: bishop_table,
-        chess.ROOK: rook_table,
-        chess.QUEEN: queen_table,
-        chess.KING: king_table
-    }
-
-    value = 0
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece:
-            table = tables[piece.piece_type]
-            idx = square if piece.color == chess.WHITE else chess.square_mirror(square) # Flips the board vertically for black
-            sign = 1 if piece.color == chess.WHITE else -1
-            value += sign * (piece_values[piece.piece_type] + table[idx])
-
-    # Add bonus for capturing opponent pieces
-    for move in board.legal_moves:
-        if board.is_capture(move):
-            captured_piece = board.piece_at(move.to_square)
-            if captured_piece:
-                value += piece_values[captured_piece.piece_type] * (1 if board.turn == chess.WHITE else -1)
+    value = material_score(board)
 
     # Favor giving check: add a smaller bonus
     if board.is_check():
@@ -168,6 +520,36 @@ def evaluate_board(board):
 
     return value
 
+def material_score(board):
+    # Full material + piece-square total of the position
+    value = 0
+    for square, piece in board.piece_map().items():
+        value += PIECE_SQUARE_SCORES[piece.color][piece.piece_type][square]
+    return value
+
+# Function to evaluate a search position, same terms as evaluate_board but using the
+# material + piece-square score the position keeps up to date on every move
+def evaluate_position(pos):
+    in_check = pos.is_check()
+    if not pos.has_legal_moves():
+        # Checkmate or stalemate
+        if in_check:
+            return -MATE_SCORE if pos.turn == chess.WHITE else MATE_SCORE
+        return 0
+    # Draw detection: fifty moves (covers seventy-five), threefold repetition (covers fivefold)
+    if pos.is_insufficient_material() or pos.halfmove_clock >= 100 or pos.is_repetition(3):
+        return 0
+    return static_score(pos, in_check)
+
+# Function to score a position that is not over: the material + piece-square score the
+# position keeps up to date and the check bonus, from White's point of view
+def static_score(pos, in_check):
+    value = pos.score
+    # Favor giving check: add a smaller bonus
+    if in_check:
+        value += 100 if pos.turn == chess.BLACK else -100
+    return value
+
 def is_piece_safe(board, square):
     """Check if a piece on the given square is safe (not under attack)."""
     for move in board.legal_moves:
@@ -175,24 +557,120 @@ def is_piece_safe(board, square):
             return False  # The piece is under attack
     return True
 
-def order_moves(board, moves):
-    #Order moves: captures and promotions first.
+def history_index(color, move):
+    # [color][from][to] index of a move in the history table
+    return (0 if color == chess.WHITE else 4096) + (move & 4095)
+
+def order_moves(pos, moves, hash_move=None, killers=(), history=None):
+    #Order moves: hash/PV move, then captures and promotions by MVV-LVA, then killer moves,
+    #then the remaining quiet moves by their history score.
     #optimization for alpha-beta pruning
+    offset = 0 if pos.turn == chess.WHITE else 4096
     def move_score(move):
-        score = 0
-        if board.is_capture(move):
-            score += 10
-        if move.promotion:
-            score += 5
-        return score
+        if move == hash_move:
+            return HASH_MOVE_SCORE
+        if move >> 12 or pos.is_capture(move):
+            return CAPTURE_SCORE + mvv_lva(pos, move)
+        if move in killers:
+            return KILLER_SCORE - killers.index(move)
+        if history is not None:
+            return history[offset + (move & 4095)]
+        return 0
     return sorted(moves, key=move_score, reverse=True)
 
+# Function to estimate the node count of the next iterative deepening depth
+# Alpha-beta trees grow unevenly between odd and even depths, so the growth over the
+# last two depths is applied to the previous one instead of using the last ratio
+def predict_next_nodes(iteration_nodes):
+    if len(iteration_nodes) >= 3:
+        return iteration_nodes[-2] * iteration_nodes[-1] / iteration_nodes[-3]
+    if len(iteration_nodes) == 2:
+        return iteration_nodes[-1] ** 2 / iteration_nodes[-2]
+    return iteration_nodes[-1] * 8
+
+# Function to follow the best moves stored in the transposition table from the root,
+# giving the principal variation as chess.Moves (at most max_length moves)
+def principal_variation(pos, tt, first_move, max_length):
+    pv = []
+    move = first_move
+    while move and len(pv) < max_length and move in pos.legal_moves():
+        pv.append(decode_move(move))
+        pos.push(move)
+        if pos.repetitions() > 1:
+            break  # a cycle, the table would lead back here forever
+        entry = tt.peek(pos.key)
+        move = entry[4] if entry is not None else None
+    for _ in pv:
+        pos.pop()
+    return pv
+
+# Function to search the root with a narrow window around the previous iteration's score
+# (aspiration window), widening it on the side that failed until the score falls inside
+def aspiration_search(pos, depth, previous, tt, search):
+    if not search.aspiration or previous is None or depth < ASPIRATION_MIN_DEPTH or abs(previous) >= TB_WIN_SCORE:
+        return negamax(pos, depth, -INFINITE, INFINITE, tt, search)
+    delta = ASPIRATION_WINDOW
+    alpha, beta = previous - delta, previous + delta
+    while True:
+        value, move = negamax(pos, depth, alpha, beta, tt, search)
+        if value <= alpha and alpha > -INFINITE:
+            alpha = max(-INFINITE, alpha - delta)
+        elif value >= beta and beta < INFINITE:
+            beta = min(INFINITE, beta + delta)
+        else:
+            return value, move
+        search.aspiration_researches += 1
+        delta *= 2
+
 # Function to perform iterative deepening search
-# This function will call alpha-beta minimax with increasing depth limits
-def iterative_deepening(board, max_depth):
+# This function will call the negamax search with increasing depth limits
+# The transposition table is kept between iterations (and moves), so every depth
+# starts from the best moves and bounds found by the previous ones
+# With time limits the search stops starting new depths once the next one is not
+# expected to fit, and aborts a running depth at the hard limit; the move of the
+# last completed depth is returned
+# With workers > 1 the root moves are searched in parallel by a pool of processes
+# on_iteration, when given, is called with the SearchStats of every completed depth;
+# they are also kept in search.iterations
+def iterative_deepening(board, max_depth=MAX_DEPTH, tt=None, limits=None, search=None, workers=1, on_iteration=None):
+    # A root position in the endgame tablebases is played from the tables without searching
+    tb_move = TABLEBASE.root_move(board) if TABLEBASE.max_pieces else None
+    if tb_move is not None:
+        if search is not None:
+            search.best_move = tb_move
+        return tb_move
+    if workers > 1:
+        from parallel_search import parallel_iterative_deepening
+        return parallel_iterative_deepening(board, max_depth, workers, tt, limits, search, on_iteration)
+    if tt is None:
+        tt = TRANSPOSITION_TABLE
+    if search is None:
+        search = Search(limits)
+    if search.limits.depth is not None:
+        max_depth = min(max_depth, search.limits.depth)
+    # The search works on its own compact copy, the board itself is never modified
+    pos = Position.from_board(board)
+    root_moves = pos.legal_moves()
+    tt.new_search()
+    search.start(pos, tt)
     best_move = None
+    score = None
     for depth in range(1, max_depth + 1):
-        _, move = alpha_beta_minimax(board, depth, float('-inf'), float('inf'), board.turn == chess.WHITE)
-        if move is not None:
-            best_move = move
+        search.begin_iteration()
+        try:
+            score, move = aspiration_search(pos, depth, score, tt, search)
+        except SearchAborted:
+            break
+        if move is not None and move in root_moves:
+            best_move = decode_move(move)
+        # Iteration results are reported from White's point of view like the evaluation
+        value = score if pos.turn == chess.WHITE else -score
+        stats = search.end_iteration(depth, value, principal_variation(pos, tt, move, depth))
+        if on_iteration is not None:
+            on_iteration(stats)
+        if search.should_stop_iterating(stats):
+            break
+    if best_move is None and root_moves:
+        # Not even depth 1 finished, still return something playable
+        best_move = decode_move(root_moves[0])
     return best_move
@@ -0,0 +1,173 @@
+import queue
+import random
+import threading
+import traceback
+from chess_ai import MAX_DEPTH, Search, random_agent, iterative_deepening
+from timecontrol import SearchLimits
+
+
+class EngineWorker:
+    """Runs agent searches on a background thread so the pygame loop keeps drawing.
+
+    submit() hands a position to the worker and returns a request id, poll()
+    returns (request_id, move) once the search is done, cancel() stops the
+    search in flight. Only one search runs at a time. With workers > 1 each
+    search is split over that many processes (see parallel_search). With an
+    OpeningBook the search agents play book moves while the book lasts.
+
+    ponder() searches the position after the opponent's expected reply while
+    the opponent thinks. If submit() then gets that position (a ponder hit) the
+    running search is kept and only gets its time limit from then on; any
+    other position stops it, and the new search starts from the transposition
+    table it filled.
+    """
+
+    def __init__(self, workers=1, book=None):
+        self.workers = workers
+        self.book = book
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.search = None  # Search currently running, read by the GUI for live info
+        self.pending = None  # id of the request that has not been answered yet
+        self.next_id = 0
+        self.last_pv = []  # PV of the last finished search, its second move is the expected reply
+        self.ponder_id = None  # request id of the ponder search
+        self.ponder_fen = None  # position the ponder search is about
+        self.ponder_search = None
+        self.ponder_result = None  # (request_id, move) of a ponder search that finished before the hit
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, board, agent, depth=None, movetime=None):
+        if self.ponder_id is not None:
+            if board.fen() == self.ponder_fen:
+                return self._ponder_hit(board, movetime)
+            self.ponder_misses += 1
+            self._stop_ponder()
+        self.next_id += 1
+        self.pending = self.next_id
+        # The search pushes and pops moves, so it gets its own copy of the board
+        self.requests.put((self.next_id, board.copy(), agent, depth, movetime, None))
+        return self.next_id
+
+    def ponder(self, board, agent, depth=None):
+        # Starts searching the position after the expected reply to the move just played,
+        # returns that reply or None when there is nothing to ponder on
+        if agent == "random" or len(self.last_pv) < 2 or not board.move_stack or self.last_pv[0] != board.peek():
+            return None
+        reply = self.last_pv[1]
+        if reply not in board.legal_moves:
+            return None
+        ponder_board = board.copy()
+        ponder_board.push(reply)
+        if ponder_board.is_game_over():
+            return None
+        self.next_id += 1
+        self.ponder_id = self.next_id
+        self.ponder_fen = ponder_board.fen()
+        self.ponder_result = None
+        # No time limit until the hit, the search object is made here so the hit can set one
+        # even if the worker has not picked the request up yet
+        self.ponder_search = Search(SearchLimits())
+        self.requests.put((self.next_id, ponder_board, agent, depth, None, self.ponder_search))
+        return reply
+
+    def pondering(self):
+        return self.ponder_id is not None
+
+    def _ponder_hit(self, board, movetime):
+        request_id = self.ponder_id
+        self.ponder_hits += 1
+        self.ponder_search.set_limits(SearchLimits(movetime=movetime), board.turn)
+        self.ponder_id = None
+        self.ponder_search = None
+        self.pending = request_id
+        if self.ponder_result is not None:
+            self.results.put(self.ponder_result)
+            self.ponder_result = None
+        return request_id
+
+    def _stop_ponder(self):
+        if self.ponder_search is not None:
+            self.ponder_search.stop()
+        self.ponder_id = None
+        self.ponder_search = None
+        self.ponder_result = None
+
+    def poll(self):
+        # Returns (request_id, move) of a finished search or None
+        try:
+            request_id, move = self.results.get_nowait()
+        except queue.Empty:
+            return None
+        if request_id == self.ponder_id:
+            # Ponder search done before the opponent moved, kept for a hit
+            self.ponder_result = (request_id, move)
+            return None
+        if request_id != self.pending:
+            return None  # Result of a cancelled request
+        self.pending = None
+        return request_id, move
+
+    def thinking(self):
+        return self.pending is not None
+
+    def cancel(self):
+        # Drop queued requests and stop the running search, its result is discarded
+        self.pending = None
+        self._stop_ponder()
+        while True:
+            try:
+                self.requests.get_nowait()
+            except queue.Empty:
+                break
+        search = self.search
+        if search is not None:
+            search.stop()
+
+    def shutdown(self):
+        self.cancel()
+        self.requests.put(None)
+        self.thread.join(timeout=1.0)
+
+    def info(self):
+        # Live (depth, nodes, score) of the running search, None when idle
+        search = self.search
+        if search is None:
+            return None
+        return search.completed_depth, search.nodes, search.best_score
+
+    def _run(self):
+        while True:
+            job = self.requests.get()
+            if job is None:
+                return
+            request_id, board, agent, depth, movetime, search = job
+            self.last_pv = []
+            try:
+                move = self._choose_move(board, agent, depth, movetime, search)
+            except Exception:
+                # The request is still answered, otherwise the GUI would wait for it forever:
+                # with the best move found before the error, or any legal move
+                traceback.print_exc()
+                move = self.search.best_move if self.search is not None else None
+                if move is None and any(board.legal_moves):
+                    move = random.choice(list(board.legal_moves))
+            finally:
+                self.search = None
+            self.results.put((request_id, move))
+
+    def _choose_move(self, board, agent, depth, movetime, search):
+        move = None
+        if agent == "random":
+            move = random_agent(board)
+        elif self.book is not None:
+            move = self.book.choose(board)
+        if move is None:
+            self.search = search or Search(SearchLimits(movetime=movetime))
+            move = iterative_deepening(board, depth or MAX_DEPTH, search=self.search, workers=self.workers)
+            if self.search.iterations:
+                self.last_pv = self.search.iterations[-1].pv
+        return move
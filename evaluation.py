@@ -0,0 +1,142 @@
+import json
+import os
+import chess
+
+# Evaluation parameters: piece values and piece-square tables, shared by the
+# board evaluator in chess_ai and the incremental score kept by position.Position
+
+PIECE_VALUES = {
+    # Piece values based on standard chess evaluation, times 100 for easier calculations
+    # Bishop is usually slightly more valued than Knight
+    chess.PAWN: 100,
+    chess.KNIGHT: 320,
+    chess.BISHOP: 330,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 0
+}
+
+# Piece-square tables (simplified, for White; Black is mirrored)
+PAWN_TABLE = [# indexing is different than board, starting row for pawns is 2nd row here 
+     0,  5,  5, -10,-10,  5,  5,  0,
+     0, 10,-10,   0,  0,-10, 10,  0,
+     0, 10, 10,  20, 20, 10, 10,  0,
+     5, 20, 20,  30, 30, 20, 20,  5,
+    10, 20, 20,  40, 40, 20, 20, 10,
+    50, 50, 50,  50, 50, 50, 50, 50,
+    90, 90, 90,  90, 90, 90, 90, 90,
+     0,  0,  0,   0,  0,  0,  0,  0
+]
+KNIGHT_TABLE = [#Knights are valued more in the center of the board
+    -50,-40,-30,-30,-30,-30,-40,-50,
+    -40,-20,  0,  0,  0,  0,-20,-40,
+    -30,  0, 10, 15, 15, 10,  0,-30,
+    -30,  5, 15, 20, 20, 15,  5,-30,
+    -30,  0, 15, 20, 20, 15,  0,-30,
+    -30,  5, 10, 15, 15, 10,  5,-30,
+    -40,-20,  0,  5,  5,  0,-20,-40,
+    -50,-40,-30,-30,-30,-30,-40,-50
+]
+BISHOP_TABLE = [ # Bishops are generally valued more in the center of the board
+    -20,-10,-10,-10,-10,-10,-10,-20,
+    -10,  5,  0,  0,  0,  0,  5,-10,
+    -10, 10, 10, 10, 10, 10, 10,-10,
+    -10,  0, 10, 10, 10, 10,  0,-10,
+    -10,  5,  5, 10, 10,  5,  5,-10,
+    -10,  0,  5, 10, 10,  5,  0,-10,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -20,-10,-10,-10,-10,-10,-10,-20
+]
+ROOK_TABLE = [ # Rooks are valued more on the 7th rank
+     0,  0,  5, 10, 10,  5,  0,  0,
+    -5,  0,  0,  0,  0,  0,  0, -5,
+    -5,  0,  0,  0,  0,  0,  0, -5,
+    -5,  0,  0,  0,  0,  0,  0, -5,
+    -5,  0,  0,  0,  0,  0,  0, -5,
+    -5,  0,  0,  0,  0,  0,  0, -5,
+     5, 10, 10, 10, 10, 10, 10,  5,
+     0,  0,  0,  0,  0,  0,  0,  0
+]
+QUEEN_TABLE = [
+    -20,-10,-10, -5, -5,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5,  5,  5,  5,  0,-10,
+     -5,  0,  5,  5,  5,  5,  0, -5,
+      0,  0,  5,  5,  5,  5,  0, -5,
+    -10,  5,  5,  5,  5,  5,  0,-10,
+    -10,  0,  5,  0,  0,  0,  0,-10,
+    -20,-10,-10, -5, -5,-10,-10,-20
+]
+KING_TABLE = [
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -20,-30,-30,-40,-40,-30,-30,-20,
+    -10,-20,-20,-20,-20,-20,-20,-10,
+     20, 20,  0,  0,  0,  0, 20, 20,
+     20, 30, 10,  0,  0, 10, 30, 20
+]
+
+# Tuned parameters written by tuning.py replace the hand-typed ones above when present
+PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_params.json")
+PARAMS_VERSION = 1
+
+
+# Function to read a parameter file, returns (piece values, piece-square tables) by piece type
+def load_params(path=PARAMS_FILE):
+    with open(path) as f:
+        params = json.load(f)
+    if params.get("version") != PARAMS_VERSION:
+        raise ValueError(f"{path}: parameter file version {params.get('version')}, expected {PARAMS_VERSION}")
+    values = {piece_type: int(params["piece_values"][chess.piece_name(piece_type)]) for piece_type in chess.PIECE_TYPES}
+    tables = {}
+    for piece_type in chess.PIECE_TYPES:
+        table = [int(value) for value in params["tables"][chess.piece_name(piece_type)]]
+        if len(table) != 64:
+            raise ValueError(f"{path}: {chess.piece_name(piece_type)} table has {len(table)} squares")
+        tables[piece_type] = table
+    return values, tables
+
+
+# Function to write a parameter file, info (positions, loss, ...) is stored along for reference
+def save_params(path, values, tables, **info):
+    params = {
+        "version": PARAMS_VERSION,
+        "piece_values": {chess.piece_name(piece_type): int(values[piece_type]) for piece_type in chess.PIECE_TYPES},
+        "tables": {chess.piece_name(piece_type): [int(value) for value in tables[piece_type]]
+                   for piece_type in chess.PIECE_TYPES},
+        "info": info,
+    }
+    with open(path, "w") as f:
+        json.dump(params, f, indent=1)
+
+
+if os.path.exists(PARAMS_FILE):
+    _values, _tables = load_params(PARAMS_FILE)
+    PIECE_VALUES.update(_values)
+    PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE = (
+        _tables[piece_type] for piece_type in chess.PIECE_TYPES)
+
+PIECE_SQUARE_TABLES = { # dictionary of piece types to their respective tables
+    chess.PAWN: PAWN_TABLE,
+    chess.KNIGHT: KNIGHT_TABLE,
+    chess.BISHOP: BISHOP_TABLE,
+    chess.ROOK: ROOK_TABLE,
+    chess.QUEEN: QUEEN_TABLE,
+    chess.KING: KING_TABLE
+}
+
+# Signed value of every piece on every square, indexed [color][piece_type][square]
+# Black squares are mirrored and negated so one lookup gives the White-relative contribution
+PIECE_SQUARE_SCORES = {
+    color: {
+        piece_type: [
+            (1 if color == chess.WHITE else -1) * (PIECE_VALUES[piece_type] +
+            table[square if color == chess.WHITE else chess.square_mirror(square)])
+            for square in chess.SQUARES
+        ]
+        for piece_type, table in PIECE_SQUARE_TABLES.items()
+    }
+    for color in chess.COLORS
+}
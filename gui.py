@@ -1,38 +1,58 @@
+import functools
 import pygame
 import chess
 import os
 
-IMAGES = {}
+IMAGES = {}  # piece images scaled to the last square size, keyed like "wp"
+BACKGROUND = (200, 200, 200)  # window area outside the board
 
-def load_images(square_size):
+# Piece images as loaded from disk, scaled copies are cached per square size
+@functools.lru_cache(maxsize=None)
+def piece_image(key):
+    path = os.path.join("assets", f"{key}.png")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Missing image: {path}")
+    return pygame.image.load(path)
+
+@functools.lru_cache(maxsize=8)
+def scaled_images(square_size):
     pieces = ['wp', 'wn', 'wb', 'wr', 'wq', 'wk',
               'bp', 'bn', 'bb', 'br', 'bq', 'bk']
-    for piece in pieces:
-        path = os.path.join("assets", f"{piece}.png")
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"Missing image: {path}")
-        IMAGES[piece] = pygame.transform.scale(
-            pygame.image.load(path), (square_size, square_size)
-        )
+    return {piece: pygame.transform.scale(piece_image(piece), (square_size, square_size)) for piece in pieces}
 
-def draw_board(screen, square_size):
+def load_images(square_size):
+    IMAGES.update(scaled_images(square_size))
+
+# Fonts are expensive to create, every size is made once
+@functools.lru_cache(maxsize=None)
+def get_font(size):
+    return pygame.font.Font(None, size)
+
+# The empty board, rendered once per square size
+@functools.lru_cache(maxsize=8)
+def board_surface(square_size):
+    surface = pygame.Surface((8 * square_size, 8 * square_size))
     colors = [pygame.Color("white"), pygame.Color("gray")]
     for r in range(8):
         for c in range(8):
             color = colors[(r + c) % 2]
-            pygame.draw.rect(screen, color, (c*square_size, r*square_size, square_size, square_size))
+            pygame.draw.rect(surface, color, (c*square_size, r*square_size, square_size, square_size))
+    return surface
+
+def square_rect(square, square_size):
+    col = chess.square_file(square)
+    row = 7 - chess.square_rank(square)
+    return pygame.Rect(col * square_size, row * square_size, square_size, square_size)
+
+def draw_board(screen, square_size):
+    screen.blit(board_surface(square_size), (0, 0))
 
 def draw_pieces(screen, board, square_size):
-    if not IMAGES:
-        load_images(square_size)
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece:
-            col = chess.square_file(square)
-            row = 7 - chess.square_rank(square)
-            color_prefix = 'w' if piece.color == chess.WHITE else 'b'
-            img_key = color_prefix + piece.symbol().lower()
-            screen.blit(IMAGES[img_key], (col*square_size, row*square_size))
+    images = scaled_images(square_size)
+    for square, piece in board.piece_map().items():
+        color_prefix = 'w' if piece.color == chess.WHITE else 'b'
+        img_key = color_prefix + piece.symbol().lower()
+        screen.blit(images[img_key], square_rect(square, square_size))
 
 def draw_highlights(screen, selected_square, legal_moves, square_size):
     if selected_square:
@@ -82,11 +102,103 @@ def draw_message(screen, message, square_size):
     screen.blit(text, text_rect)
 
 def get_square_under_mouse(square_size):
+    # Square name like "e4", None outside the board (the window may be wider than the board)
     mx, my = pygame.mouse.get_pos()
     col = mx // square_size
     row = my // square_size
+    if not (0 <= col < 8 and 0 <= row < 8):
+        return None
     return f"{chr(col + ord('a'))}{7 - row + 1}"
 
+
+class BoardRenderer:
+    """Draws the board incrementally and returns the rectangles that changed.
+
+    render() compares what every square should show (piece, selection, legal move
+    dot, check) with what it showed last frame and only redraws the squares that
+    differ, on top of the cached empty board. Text overlays (timer, status line)
+    are redrawn when their text changes or a square under them was redrawn. The
+    caller passes the returned rectangles to pygame.display.update().
+    """
+
+    def __init__(self, square_size):
+        self.overlays = {}  # name -> (text, rect on screen)
+        self.resize(square_size)
+
+    def resize(self, square_size):
+        self.square_size = square_size
+        self.shown = {}  # square -> what is drawn on it
+        self.full_redraw = True
+
+    def invalidate(self, square):
+        # Forces a redraw of a square that was drawn on outside of the renderer
+        self.shown.pop(square, None)
+
+    def square_state(self, board, selected, legal_moves, check_square):
+        pieces = board.piece_map()
+        selected = chess.parse_square(selected) if selected else None
+        legal = set(legal_moves)
+        return {square: (pieces[square].symbol() if square in pieces else None,
+                         square == selected, square in legal, square == check_square)
+                for square in chess.SQUARES}
+
+    def draw_square(self, screen, square, state):
+        size = self.square_size
+        rect = square_rect(square, size)
+        screen.blit(board_surface(size), rect, rect)
+        symbol, selected, legal, check = state
+        if symbol:
+            key = ('w' if symbol.isupper() else 'b') + symbol.lower()
+            screen.blit(scaled_images(size)[key], rect)
+        if check:
+            pygame.draw.rect(screen, pygame.Color("red"), rect, 5)
+        if selected:
+            pygame.draw.rect(screen, pygame.Color("yellow"), rect, 5)
+        if legal:
+            pygame.draw.circle(screen, pygame.Color("blue"), rect.center, size // 4)
+        return rect
+
+    def render(self, screen, board, selected=None, legal_moves=(), check_square=None):
+        state = self.square_state(board, selected, legal_moves, check_square)
+        dirty = []
+        if self.full_redraw:
+            screen.fill(BACKGROUND)
+            dirty.append(screen.get_rect())
+            self.overlays = {name: (None, rect) for name, (_, rect) in self.overlays.items()}
+        for square, square_state in state.items():
+            if self.full_redraw or self.shown.get(square) != square_state:
+                rect = self.draw_square(screen, square, square_state)
+                if not self.full_redraw:
+                    dirty.append(rect)
+        self.shown = state
+        self.full_redraw = False
+        self.frame_dirty = dirty
+        return dirty
+
+    def restore(self, screen, rect):
+        # Puts the board (or background) back under a rectangle
+        screen.fill(BACKGROUND, rect)
+        dirty = [rect]
+        for square, square_state in self.shown.items():
+            if square_rect(square, self.square_size).colliderect(rect):
+                dirty.append(self.draw_square(screen, square, square_state))
+        return dirty
+
+    def draw_overlay(self, screen, name, text, position, size, background=None):
+        # Draws a line of text over the board, None removes it. Call after render().
+        old_text, old_rect = self.overlays.get(name, (None, None))
+        covered = old_rect is not None and old_rect.collidelist(self.frame_dirty) != -1
+        if text == old_text and not covered:
+            return []
+        dirty = self.restore(screen, old_rect) if old_rect is not None and text != old_text else []
+        if text is None:
+            self.overlays.pop(name, None)
+            return dirty
+        surface = get_font(size).render(text, True, (0, 0, 0), background)
+        rect = screen.blit(surface, position)
+        self.overlays[name] = (text, rect)
+        return dirty + [rect]
+
 if __name__ == "__main__":
     pygame.init()
     WIDTH = HEIGHT = 640
@@ -95,12 +207,11 @@ if __name__ == "__main__":
     board = chess.Board()
     clock = pygame.time.Clock()
     running = True
+    renderer = BoardRenderer(SQUARE_SIZE)
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-        draw_board(screen, SQUARE_SIZE)
-        draw_pieces(screen, board, SQUARE_SIZE)
-        pygame.display.flip()
+        pygame.display.update(renderer.render(screen, board))
         clock.tick(30)
     pygame.quit()
@@ -1,7 +1,8 @@
 import chess
 import pygame
-from gui import draw_board, draw_pieces, get_square_under_mouse, draw_highlights, draw_promotion_highlight, draw_check_highlight, draw_message
-from chess_ai import random_agent, iterative_deepening
+from gui import BoardRenderer, get_square_under_mouse, draw_promotion_highlight
+from book import OpeningBook
+from engine_worker import EngineWorker
 import time
 
 pygame.init()
@@ -9,7 +10,7 @@ pygame.init()
 # Constants for the game
 WIDTH, HEIGHT = 640, 640
 SQUARE_SIZE = WIDTH // 8
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
+screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
 pygame.display.set_caption("Chess Agent Modes")
 
 # Function to display the mode selection screen
@@ -49,6 +50,10 @@ clock = pygame.time.Clock()
 
 mode = mode_selection_screen(screen, SQUARE_SIZE)
 
+# Per-move time budget in seconds for the alpha-beta agents, None searches to full depth
+white_time = None
+black_time = None
+
 # Set up agents and depths based on mode
 if mode == 1:  # Human vs Random Agent
     white_agent = "human"
@@ -62,6 +67,7 @@ elif mode == 3: # Human vs Alpha-Beta Agent (hard)
     white_agent = "human"
     black_agent = "alpha"
     black_depth = 5
+    black_time = 5.0
 elif mode == 4: # Alpha-Beta Agent vs Random Agent
     white_agent = "alpha"
     white_depth = 4
@@ -72,6 +78,7 @@ elif mode == 5: # Alpha-Beta Agent (easy) vs Alpha-Beta Agent (hard)
     white_depth = 3
     black_agent = "alpha"
     black_depth = 4
+    black_time = 5.0
 else: # Invalid mode, default to Human vs Random Agent
     white_agent = "human"
     black_agent = "random"
@@ -131,23 +138,46 @@ def get_material_count(board):
                 black_material += value
     return white_material, black_material
 
+# Function to collect the move of a finished background search
+def poll_ai_move(engine):
+    result = engine.poll()
+    if result is None:
+        return None
+    return result[1]
+
+# Function to describe what the engine is doing while it searches, None when idle
+def thinking_text(engine):
+    if engine.thinking():
+        label = "Thinking..."
+    elif engine.pondering():
+        label = "Pondering..."
+    else:
+        return None
+    info = engine.info()
+    if info is not None and info[0]:
+        depth, nodes, score = info
+        return f"{label} depth {depth}  nodes {nodes}  score {score}"
+    return label
+
+engine = EngineWorker(book=OpeningBook())
+renderer = BoardRenderer(SQUARE_SIZE)
+
 # Main game loop
 while running:
-    # Draw the board and pieces
-    draw_board(screen, SQUARE_SIZE)
-    draw_pieces(screen, board, SQUARE_SIZE)
-    draw_highlights(screen, selected_square, legal_moves, SQUARE_SIZE)
+    # Redraw only the squares and texts that changed since the last frame
+    check_square = board.king(board.turn) if board.is_check() else None
+    dirty = renderer.render(screen, board, selected_square, legal_moves, check_square)
 
     # Timer
     elapsed = int(time.time() - start_time)
     minutes = elapsed // 60
     seconds = elapsed % 60
     timer_text = f"Time: {minutes:02}:{seconds:02}"
-    font = pygame.font.Font(None, 28)
-    timer_surface = font.render(timer_text, True, (0, 0, 0))
-    screen.blit(timer_surface, (WIDTH - 150, 10))
+    dirty += renderer.draw_overlay(screen, "timer", timer_text, (WIDTH - 150, 10), 28)
+    dirty += renderer.draw_overlay(screen, "status", thinking_text(engine), (10, HEIGHT - 25), 24, (230, 230, 230))
 
-    pygame.display.flip()
+    if dirty:
+        pygame.display.update(dirty)
     clock.tick(30)
 
     # Event handling, divided by agent type; Human or AI
@@ -156,9 +186,18 @@ while running:
         if event.type == pygame.QUIT:
             running = False
 
+        # The board is scaled to the smaller side of the window
+        elif event.type == pygame.VIDEORESIZE:
+            screen = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
+            SQUARE_SIZE = max(1, min(event.w, event.h) // 8)
+            WIDTH = HEIGHT = SQUARE_SIZE * 8
+            renderer.resize(SQUARE_SIZE)
+
         # Human move (White)
         elif event.type == pygame.MOUSEBUTTONDOWN and board.turn == chess.WHITE and white_agent == "human":
             clicked_square = get_square_under_mouse(SQUARE_SIZE)
+            if clicked_square is None: # Clicked next to the board
+                continue
             if selected_square is None: #No piece selected
                 # Clicked square is stored in selected_square and legal moves are calculated and added to legal_moves
                 selected_square = clicked_square
@@ -179,6 +218,7 @@ while running:
                         # If pawn reaches the last rank, promote it to a queen(auto promotion)
                         move.promotion = chess.QUEEN
                         draw_promotion_highlight(screen, move.to_square, SQUARE_SIZE)
+                        renderer.invalidate(move.to_square)
                     if move in board.legal_moves:# Normal move
                         # Push the move to the board and update the game state
                         board.push(move)
@@ -195,16 +235,15 @@ while running:
                 legal_moves = []
 
     # AI moves (White)
+    # The search runs on the engine thread, the loop keeps drawing until the move arrives
     if white_agent != "human" and board.turn == chess.WHITE and running:
-        if check_game_over(board, screen, SQUARE_SIZE):
-            running = False
-            continue
-
-        # Determine AI move based on agent type
-        if white_agent == "random":
-            ai_move = random_agent(board)
-        elif white_agent == "alpha":
-            ai_move = iterative_deepening(board, white_depth)
+        if not engine.thinking():
+            if check_game_over(board, screen, SQUARE_SIZE):
+                running = False
+                continue
+            # Determine AI move based on agent type
+            engine.submit(board, white_agent, white_depth, white_time)
+        ai_move = poll_ai_move(engine)
 
         # If a valid move is found, push it to the boar
         if ai_move is not None and ai_move in board.legal_moves:
@@ -212,20 +251,27 @@ while running:
             white_moves += 1
             if check_game_over(board, screen, SQUARE_SIZE):
                 running = False
+            elif black_agent == "human":
+                # Think on the human's time about the reply the search expects
+                engine.ponder(board, white_agent, white_depth)
 
     # AI moves (Black)
     if black_agent != "human" and board.turn == chess.BLACK and running:
-        if check_game_over(board, screen, SQUARE_SIZE):
-            running = False
-            continue
-        if black_agent == "random":
-            ai_move = random_agent(board)
-        elif black_agent == "alpha":
-            ai_move = iterative_deepening(board, black_depth)
+        if not engine.thinking():
+            if check_game_over(board, screen, SQUARE_SIZE):
+                running = False
+                continue
+            engine.submit(board, black_agent, black_depth, black_time)
+        ai_move = poll_ai_move(engine)
         if ai_move is not None and ai_move in board.legal_moves:
             board.push(ai_move)
             black_moves += 1
             if check_game_over(board, screen, SQUARE_SIZE):
                 running = False
+            elif white_agent == "human":
+                # Think on the human's time about the reply the search expects
+                engine.ponder(board, black_agent, black_depth)
 
+# Stop a search that is still running so the process can exit right away
+engine.shutdown()
 pygame.quit()
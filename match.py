@@ -0,0 +1,196 @@
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import chess
+import chess.pgn
+from chess_ai import MAX_DEPTH, Search, iterative_deepening, random_agent
+from timecontrol import SearchLimits
+from transposition import TranspositionTable
+
+# Headless engine-vs-engine matches: games are played in a process pool, every opening
+# is played twice with colours swapped and finished games are appended to a PGN file
+# as they come in.
+#
+#   python match.py "alpha:depth=4" "alpha:depth=3,movetime=0.5" --games 40 --openings book.epd
+
+# Games are adjudicated as a draw after this many plies
+MAX_PLIES = 300
+
+# Table size per agent and game, small because every worker plays one game at a time
+AGENT_TABLE_MB = 16
+
+# Search depth of an alpha agent given no depth, movetime or nodes limit
+DEFAULT_AGENT_DEPTH = 4
+
+
+class Agent:
+    """Agent description parsed from "random" or "alpha:depth=4,movetime=0.5,nodes=20000".
+
+    lmr=0 switches late-move reductions off, to measure what they cost or gain.
+    """
+
+    def __init__(self, kind="alpha", depth=None, movetime=None, nodes=None, lmr=None):
+        if kind not in ("alpha", "random"):
+            raise ValueError(f"Unknown agent type: {kind}")
+        self.kind = kind
+        if kind == "alpha" and depth is None and movetime is None and nodes is None:
+            # Without any limit the search would go on to MAX_DEPTH on every move
+            depth = DEFAULT_AGENT_DEPTH
+        self.depth = depth
+        self.movetime = movetime
+        self.nodes = nodes
+        self.lmr = lmr
+
+    @classmethod
+    def parse(cls, text):
+        kind, _, options = text.partition(":")
+        values = {}
+        for option in filter(None, options.split(",")):
+            name, _, value = option.partition("=")
+            if name not in ("depth", "movetime", "nodes", "lmr"):
+                raise ValueError(f"Unknown agent option: {name}")
+            values[name] = float(value) if name == "movetime" else int(value)
+        return cls(kind, **values)
+
+    def __str__(self):
+        options = [f"{name}={getattr(self, name)}" for name in ("depth", "movetime", "nodes", "lmr")
+                   if getattr(self, name) is not None]
+        return self.kind + (":" + ",".join(options) if options else "")
+
+
+def load_openings(path):
+    # One position per line, FEN or EPD; empty lines and # comments are skipped
+    openings = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                openings.append(chess.Board(" ".join(fields[:6])).fen())
+            else:
+                board, _ = chess.Board.from_epd(line)
+                openings.append(board.fen())
+    return openings
+
+
+def play_game(white, black, fen):
+    # Runs in a worker process. Returns the game and per colour (nodes, seconds searched)
+    board = chess.Board(fen)
+    agents = {chess.WHITE: white, chess.BLACK: black}
+    tables = {chess.WHITE: TranspositionTable(AGENT_TABLE_MB), chess.BLACK: TranspositionTable(AGENT_TABLE_MB)}
+    stats = {chess.WHITE: [0, 0.0], chess.BLACK: [0, 0.0]}
+    while not board.is_game_over(claim_draw=True) and board.ply() < MAX_PLIES:
+        agent = agents[board.turn]
+        if agent.kind == "random":
+            move = random_agent(board)
+        else:
+            search = Search(SearchLimits(movetime=agent.movetime, nodes=agent.nodes),
+                            late_move_reductions=agent.lmr != 0)
+            move = iterative_deepening(board, agent.depth or MAX_DEPTH, tt=tables[board.turn], search=search)
+            stats[board.turn][0] += search.nodes
+            stats[board.turn][1] += search.elapsed()
+        board.push(move)
+    result = board.result(claim_draw=True)
+    if result == "*":
+        result = "1/2-1/2"  # adjudicated at the ply limit
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Result"] = result
+    game.headers["White"] = str(white)
+    game.headers["Black"] = str(black)
+    if fen != chess.STARTING_FEN:
+        game.headers["FEN"] = fen
+        game.headers["SetUp"] = "1"
+    return game, stats[chess.WHITE], stats[chess.BLACK]
+
+
+def elo_difference(scores):
+    # Elo difference of the first agent and its 95% error margin, from per-game scores (1, 0.5, 0)
+    n = len(scores)
+    if not n:
+        return 0.0, float("inf")
+    mean = sum(scores) / n
+    deviation = math.sqrt(sum((score - mean) ** 2 for score in scores) / n)
+    margin = 1.96 * deviation / math.sqrt(n)
+
+    def to_elo(p):
+        if p <= 0:
+            return float("-inf")
+        if p >= 1:
+            return float("inf")
+        return -400 * math.log10(1 / p - 1)
+
+    elo = to_elo(mean)
+    if mean in (0.0, 1.0):
+        return elo, float("inf")
+    return elo, (to_elo(min(1.0, mean + margin)) - to_elo(max(0.0, mean - margin))) / 2
+
+
+def run_match(first, second, games, openings, workers, pgn_path):
+    # Plays the match and returns the per-game scores of the first agent and the nps figures
+    schedule = []
+    for i in range(games):
+        fen = openings[(i // 2) % len(openings)]
+        # Even games: first agent has White, odd games: colours swapped on the same opening
+        schedule.append((fen, i % 2 == 0))
+    scores = []
+    wins = draws = losses = 0
+    nodes = {first: 0, second: 0}
+    seconds = {first: 0.0, second: 0.0}
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(pgn_path, "a") as pgn:
+        futures = {}
+        for round_number, (fen, first_is_white) in enumerate(schedule, 1):
+            white, black = (first, second) if first_is_white else (second, first)
+            futures[pool.submit(play_game, white, black, fen)] = (round_number, first_is_white)
+        for future in as_completed(futures):
+            round_number, first_is_white = futures[future]
+            game, white_stats, black_stats = future.result()
+            game.headers["Round"] = str(round_number)
+            print(game, file=pgn, end="\n\n", flush=True)
+
+            first_stats, second_stats = (white_stats, black_stats) if first_is_white else (black_stats, white_stats)
+            nodes[first] += first_stats[0]
+            seconds[first] += first_stats[1]
+            nodes[second] += second_stats[0]
+            seconds[second] += second_stats[1]
+            result = game.headers["Result"]
+            score = {"1-0": 1.0, "0-1": 0.0}.get(result, 0.5)
+            if not first_is_white:
+                score = 1.0 - score
+            scores.append(score)
+            wins += score == 1.0
+            draws += score == 0.5
+            losses += score == 0.0
+            print(f"Game {round_number}: {game.headers['White']} - {game.headers['Black']} {result}"
+                  f"   +{wins} ={draws} -{losses}", flush=True)
+    nps = {agent: nodes[agent] / seconds[agent] if seconds[agent] else 0.0 for agent in (first, second)}
+    return scores, (wins, draws, losses), nps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a headless engine-vs-engine match")
+    parser.add_argument("first", help='agent, e.g. "alpha:depth=4" or "random"')
+    parser.add_argument("second", help='agent, e.g. "alpha:depth=3,movetime=0.5"')
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--openings", help="file with one FEN or EPD position per line")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pgn", default="match.pgn", help="games are appended to this file")
+    args = parser.parse_args()
+
+    try:
+        first, second = Agent.parse(args.first), Agent.parse(args.second)
+    except ValueError as e:
+        sys.exit(str(e))
+    openings = load_openings(args.openings) if args.openings else [chess.STARTING_FEN]
+    start = time.perf_counter()
+    scores, (wins, draws, losses), nps = run_match(first, second, args.games, openings, args.workers, args.pgn)
+    elo, margin = elo_difference(scores)
+    print(f"\n{first} vs {second}: +{wins} ={draws} -{losses} in {time.perf_counter() - start:.1f} s")
+    print(f"Elo difference: {elo:+.1f} +/- {margin:.1f} (95%)")
+    for agent in (first, second):
+        if agent.kind == "alpha":
+            print(f"{agent}: {nps[agent]:.0f} nodes/s")
@@ -0,0 +1,180 @@
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+import chess
+import chess_ai
+from chess_ai import INFINITE, Search, SearchAborted, negamax, order_moves, principal_variation
+from position import Position, decode_move
+from tablebase import TABLEBASE
+from timecontrol import SearchLimits
+
+# Root-split parallel search: at every depth the first root move is searched in this
+# process to get a bound, then the remaining root moves are spread over a pool of
+# worker processes. Workers share the best root score found so far, so each root
+# move starts with the tightest bound known at the time it is picked up. Every worker
+# keeps its own transposition table (chess_ai.TRANSPOSITION_TABLE) warm between tasks.
+
+_pool = None
+_pool_workers = 0
+_pool_tablebases = []  # tablebase directories the workers were started with
+_bound = None  # best root score of the running depth, from the side to move's point of view
+_stop = None  # set to 1 by the parent to abort every worker
+_search_id = None  # last root search seen by this worker, to age its table once per search
+_ordering = None  # killers and history of this worker, kept across the root moves of one search
+
+
+def _init_worker(bound, stop, tablebase_paths):
+    global _bound, _stop
+    _bound = bound
+    _stop = stop
+    if tablebase_paths:
+        TABLEBASE.configure(tablebase_paths)
+
+
+class _WorkerSearch(Search):
+    # Search that also obeys the parent's stop flag
+    def check(self):
+        if self.nodes + 1 >= self.next_check and _stop.value:
+            self.stopped = True
+        Search.check(self)
+
+
+def _search_root_move(board, move, depth, time_left, search_id):
+    # Runs in a worker: searches one root move, returns (move, score or None if aborted, nodes)
+    global _search_id, _ordering
+    tt = chess_ai.TRANSPOSITION_TABLE
+    search = _WorkerSearch(SearchLimits(movetime=time_left))
+    if search_id != _search_id:
+        _search_id = search_id
+        _ordering = (search.killers, search.history)
+        tt.new_search()
+    search.killers, search.history = _ordering
+    pos = Position.from_board(board)
+    search.start(pos)
+    pos.push(move)
+    bound = int(_bound.value)
+    try:
+        # Only has to beat the best score found so far by any move: zero window first,
+        # searched again with the full window only when it fails high, as negamax does
+        # for every move after the first
+        value = -negamax(pos, depth - 1, -bound - 1, -bound, tt, search)[0]
+        if value > bound:
+            value = -negamax(pos, depth - 1, -INFINITE, -bound, tt, search)[0]
+    except SearchAborted:
+        return move, None, search.nodes
+    finally:
+        # The history table is replaced when it gets halved
+        _ordering = (search.killers, search.history)
+    if value <= bound:
+        # Failed low, the score is only an upper bound and the move cannot be the best
+        return move, -INFINITE, search.nodes
+    # Share an improved bound with the other workers
+    with _bound.get_lock():
+        if value > _bound.value:
+            _bound.value = value
+    return move, value, search.nodes
+
+
+def get_pool(workers):
+    # Pool is kept between searches so the worker tables stay warm across moves
+    global _pool, _pool_workers, _pool_tablebases, _bound, _stop
+    if _pool is not None and _pool_workers == workers and _pool_tablebases == TABLEBASE.paths:
+        return _pool
+    shutdown_pool()
+    # Workers are spawned, not forked: the pool is usually created on a search thread and a
+    # forked child inherits whatever the other threads hold, e.g. the UCI loop blocked on stdin
+    context = multiprocessing.get_context("spawn")
+    _bound = context.Value('d', 0.0)
+    _stop = context.Value('b', 0)
+    _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                initargs=(_bound, _stop, list(TABLEBASE.paths)))
+    _pool_workers = workers
+    _pool_tablebases = list(TABLEBASE.paths)
+    # Start every worker now: spawning one and importing the engine takes a good part of a
+    # second, which would otherwise come out of the first search's time
+    wait([_pool.submit(int) for _ in range(workers)])
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+        _pool_workers = 0
+
+
+atexit.register(shutdown_pool)
+
+
+def parallel_iterative_deepening(board, max_depth, workers, tt=None, limits=None, search=None, on_iteration=None):
+    # Same contract as chess_ai.iterative_deepening, with the root moves of every depth
+    # searched by a pool of worker processes. A node limit is only checked between depths.
+    # Worker nodes are added to search.nodes, the other counters only cover this process
+    # and the PV is only as long as this process' table knows it.
+    pool = get_pool(workers)
+    if tt is None:
+        tt = chess_ai.TRANSPOSITION_TABLE
+    if search is None:
+        search = Search(limits)
+    if search.limits.depth is not None:
+        max_depth = min(max_depth, search.limits.depth)
+    pos = Position.from_board(board)
+    tt.new_search()
+    search.start(pos, tt)
+    search_id = (id(search), search.start_time)
+    moves = pos.legal_moves()
+    if not moves:
+        return None
+    best_move = None
+    for depth in range(1, max_depth + 1):
+        search.begin_iteration()
+        ordered = order_moves(pos, moves)
+        if best_move is not None:
+            ordered.remove(best_move)
+            ordered.insert(0, best_move)
+
+        # The first (expected best) move is searched here to give the workers a bound
+        first = ordered[0]
+        pos.push(first)
+        try:
+            value = -negamax(pos, depth - 1, -INFINITE, INFINITE, tt, search)[0]
+        except SearchAborted:
+            break
+        pos.pop()
+
+        _bound.value = value
+        _stop.value = 0
+        time_left = None
+        if search.hard_limit is not None:
+            time_left = max(0.0, search.hard_limit - search.elapsed())
+        pending = {pool.submit(_search_root_move, board, move, depth, time_left, search_id)
+                   for move in ordered[1:]}
+        iteration_move, iteration_value = first, value
+        aborted = False
+        while pending:
+            done, pending = wait(pending, timeout=0.05)
+            for future in done:
+                move, move_value, nodes = future.result()
+                search.nodes += nodes
+                if move_value is None:
+                    aborted = True
+                elif move_value > iteration_value:
+                    iteration_move, iteration_value = move, move_value
+            if pending and (search.stopped or
+                            (search.hard_limit is not None and search.elapsed() >= search.hard_limit)):
+                _stop.value = 1
+        if aborted:
+            break
+
+        best_move = iteration_move
+        if pos.turn == chess.BLACK:
+            iteration_value = -iteration_value  # reported from White's point of view
+        stats = search.end_iteration(depth, iteration_value, principal_variation(pos, tt, best_move, depth))
+        if on_iteration is not None:
+            on_iteration(stats)
+        if search.should_stop_iterating(stats):
+            break
+    if best_move is None:
+        best_move = moves[0]
+    return decode_move(best_move)
@@ -0,0 +1,654 @@
+import chess
+import chess.polyglot
+from evaluation import PIECE_SQUARE_SCORES
+
+# Compact position used by the search instead of chess.Board.
+#
+# Pieces are kept both as a 64-square mailbox of piece codes and as one integer
+# bitboard per piece code. A piece code is the python-chess piece type for White
+# and piece type + 8 for Black, 0 is an empty square. Moves are plain ints:
+# from_square | to_square << 6 | promotion << 12. push()/pop() only write into
+# preallocated undo arrays and keep the Polyglot Zobrist key and the material +
+# piece-square score up to date. Only standard chess is supported (no Chess960).
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING
+BLACK_OFFSET = 8
+
+# Plies that can be pushed on top of the position it was created from
+MAX_PLIES = 512
+
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+BB_SQUARES = chess.BB_SQUARES
+KNIGHT_ATTACKS = chess.BB_KNIGHT_ATTACKS
+KING_ATTACKS = chess.BB_KING_ATTACKS
+PAWN_ATTACKS = chess.BB_PAWN_ATTACKS  # [color][square]
+RANK_ATTACKS, RANK_MASKS = chess.BB_RANK_ATTACKS, chess.BB_RANK_MASKS
+FILE_ATTACKS, FILE_MASKS = chess.BB_FILE_ATTACKS, chess.BB_FILE_MASKS
+DIAG_ATTACKS, DIAG_MASKS = chess.BB_DIAG_ATTACKS, chess.BB_DIAG_MASKS
+BETWEEN = [[chess.between(a, b) for b in chess.SQUARES] for a in chess.SQUARES]
+
+# Castling rights left after a move touches a square (king or rook moved or captured)
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[chess.E1] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[chess.H1] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASK[chess.A1] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASK[chess.E8] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[chess.H8] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASK[chess.A8] = 15 & ~BLACK_QUEENSIDE
+
+# Polyglot Zobrist keys, so position keys match chess.polyglot.zobrist_hash and opening books
+_RANDOM = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+ZOBRIST_PIECE = [[0] * 64 for _ in range(15)]
+PIECE_SCORE = [[0] * 64 for _ in range(15)]  # signed material + piece-square value per code and square
+for _piece_type in chess.PIECE_TYPES:
+    for _color in chess.COLORS:
+        _code = _piece_type if _color == chess.WHITE else _piece_type + BLACK_OFFSET
+        _index = (_piece_type - 1) * 2 + (1 if _color == chess.WHITE else 0)
+        ZOBRIST_PIECE[_code] = [_RANDOM[64 * _index + square] for square in chess.SQUARES]
+        PIECE_SCORE[_code] = list(PIECE_SQUARE_SCORES[_color][_piece_type])
+ZOBRIST_CASTLING = [0] * 16
+for _rights in range(16):
+    for _bit in range(4):
+        if _rights & (1 << _bit):
+            ZOBRIST_CASTLING[_rights] ^= _RANDOM[768 + _bit]
+ZOBRIST_EP_FILE = [_RANDOM[772 + file] for file in range(8)]
+ZOBRIST_TURN = _RANDOM[780]
+
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+def popcount(bb):
+    return bin(bb).count("1")
+
+
+def rook_attacks(square, occupied):
+    return (RANK_ATTACKS[square][occupied & RANK_MASKS[square]] |
+            FILE_ATTACKS[square][occupied & FILE_MASKS[square]])
+
+
+def bishop_attacks(square, occupied):
+    return DIAG_ATTACKS[square][occupied & DIAG_MASKS[square]]
+
+
+def encode_move(move):
+    # chess.Move -> int
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(move):
+    # int -> chess.Move
+    return chess.Move(move & 63, (move >> 6) & 63, (move >> 12) or None)
+
+
+class Position:
+    __slots__ = ("mailbox", "bbs", "occupied_co", "occupied", "turn", "castling", "ep_square",
+                 "ep_key", "halfmove_clock", "fullmove_number", "key", "score", "ply",
+                 "keys", "history", "_moves", "_captured", "_castling", "_ep_square", "_ep_key",
+                 "_halfmove", "_key", "_score")
+
+    def __init__(self):
+        self.mailbox = [0] * 64
+        self.bbs = [0] * 15
+        self.occupied_co = [0, 0]  # indexed by chess.BLACK / chess.WHITE
+        self.occupied = 0
+        self.turn = chess.WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.ep_key = 0  # Zobrist contribution of ep_square, 0 when no pawn can take en passant
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.key = 0
+        self.score = 0
+        self.ply = 0  # moves pushed since the position was created
+        # Keys of earlier positions back to the last irreversible move, then one per pushed ply
+        self.keys = [0] * MAX_PLIES
+        self.history = 0
+        self._moves = [0] * MAX_PLIES
+        self._captured = [0] * MAX_PLIES
+        self._castling = [0] * MAX_PLIES
+        self._ep_square = [None] * MAX_PLIES
+        self._ep_key = [0] * MAX_PLIES
+        self._halfmove = [0] * MAX_PLIES
+        self._key = [0] * MAX_PLIES
+        self._score = [0] * MAX_PLIES
+
+    @classmethod
+    def from_board(cls, board):
+        pos = cls()
+        for square, piece in board.piece_map().items():
+            code = piece.piece_type if piece.color == chess.WHITE else piece.piece_type + BLACK_OFFSET
+            pos.mailbox[square] = code
+            pos.bbs[code] |= BB_SQUARES[square]
+            pos.occupied_co[piece.color] |= BB_SQUARES[square]
+        pos.occupied = pos.occupied_co[chess.WHITE] | pos.occupied_co[chess.BLACK]
+        pos.turn = board.turn
+        rights = board.clean_castling_rights()
+        pos.castling = ((WHITE_KINGSIDE if rights & chess.BB_H1 else 0) |
+                        (WHITE_QUEENSIDE if rights & chess.BB_A1 else 0) |
+                        (BLACK_KINGSIDE if rights & chess.BB_H8 else 0) |
+                        (BLACK_QUEENSIDE if rights & chess.BB_A8 else 0))
+        pos.ep_square = board.ep_square
+        pos.halfmove_clock = board.halfmove_clock
+        pos.fullmove_number = board.fullmove_number
+        pos.ep_key = pos._ep_key_for(pos.ep_square, pos.turn)
+        pos.key = pos.compute_key()
+        pos.score = sum(PIECE_SCORE[pos.mailbox[square]][square] for square in chess.SQUARES if pos.mailbox[square])
+        # Keys of the positions since the last capture or pawn move, for repetition detection
+        previous = []
+        copy = board.copy()
+        while copy.move_stack and len(previous) < min(board.halfmove_clock, MAX_PLIES // 2):
+            copy.pop()
+            previous.append(chess.polyglot.zobrist_hash(copy))
+        previous.reverse()
+        pos.keys[:len(previous)] = previous
+        pos.history = len(previous)
+        pos.keys[pos.history] = pos.key
+        return pos
+
+    @classmethod
+    def from_fen(cls, fen):
+        return cls.from_board(chess.Board(fen))
+
+    def to_board(self):
+        return chess.Board(self.fen())
+
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ""
+            empty = 0
+            for file in range(8):
+                code = self.mailbox[rank * 8 + file]
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                symbol = chess.PIECE_SYMBOLS[code & 7]
+                row += symbol.upper() if code < BLACK_OFFSET else symbol
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        castling = "".join(symbol for bit, symbol in ((WHITE_KINGSIDE, "K"), (WHITE_QUEENSIDE, "Q"),
+                                                        (BLACK_KINGSIDE, "k"), (BLACK_QUEENSIDE, "q"))
+                           if self.castling & bit) or "-"
+        ep = chess.SQUARE_NAMES[self.ep_square] if self.ep_key else "-"
+        return (f"{'/'.join(rows)} {'w' if self.turn == chess.WHITE else 'b'} {castling} {ep} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def compute_key(self):
+        key = ZOBRIST_CASTLING[self.castling] ^ self.ep_key
+        if self.turn == chess.WHITE:
+            key ^= ZOBRIST_TURN
+        for square in chess.SQUARES:
+            code = self.mailbox[square]
+            if code:
+                key ^= ZOBRIST_PIECE[code][square]
+        return key
+
+    def _ep_key_for(self, ep_square, turn):
+        # Polyglot only hashes the en passant file if a pawn of the side to move could capture
+        if ep_square is None:
+            return 0
+        own_pawns = self.bbs[PAWN if turn == chess.WHITE else PAWN + BLACK_OFFSET]
+        if PAWN_ATTACKS[not turn][ep_square] & own_pawns:
+            return ZOBRIST_EP_FILE[ep_square & 7]
+        return 0
+
+    def piece_type_at(self, square):
+        return self.mailbox[square] & 7
+
+    def color_at(self, square):
+        code = self.mailbox[square]
+        if not code:
+            return None
+        return chess.WHITE if code < BLACK_OFFSET else chess.BLACK
+
+    def pieces_mask(self, piece_type, color):
+        return self.bbs[piece_type if color == chess.WHITE else piece_type + BLACK_OFFSET]
+
+    def king(self, color):
+        return lsb(self.bbs[KING if color == chess.WHITE else KING + BLACK_OFFSET])
+
+    def is_capture(self, move):
+        to_square = (move >> 6) & 63
+        if self.mailbox[to_square]:
+            return True
+        return to_square == self.ep_square and self.mailbox[move & 63] & 7 == PAWN
+
+    def is_en_passant(self, move):
+        to_square = (move >> 6) & 63
+        return (to_square == self.ep_square and self.mailbox[move & 63] & 7 == PAWN
+                and not self.mailbox[to_square])
+
+    def captured_type(self, move):
+        # Piece type taken by move, 0 for quiet moves
+        to_square = (move >> 6) & 63
+        code = self.mailbox[to_square]
+        if code:
+            return code & 7
+        if to_square == self.ep_square and self.mailbox[move & 63] & 7 == PAWN:
+            return PAWN
+        return 0
+
+    def attackers_mask(self, color, square, occupied=None):
+        # Pieces of color attacking square, sliders see through squares missing from occupied
+        if occupied is None:
+            occupied = self.occupied
+        bbs = self.bbs
+        offset = 0 if color == chess.WHITE else BLACK_OFFSET
+        queens = bbs[QUEEN + offset]
+        return ((KNIGHT_ATTACKS[square] & bbs[KNIGHT + offset]) |
+                (KING_ATTACKS[square] & bbs[KING + offset]) |
+                (PAWN_ATTACKS[not color][square] & bbs[PAWN + offset]) |
+                (rook_attacks(square, occupied) & (bbs[ROOK + offset] | queens)) |
+                (bishop_attacks(square, occupied) & (bbs[BISHOP + offset] | queens))) & occupied
+
+    def is_check(self):
+        return bool(self.attackers_mask(not self.turn, self.king(self.turn)))
+
+    def push(self, move):
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        promotion = move >> 12
+        mailbox = self.mailbox
+        bbs = self.bbs
+        occupied_co = self.occupied_co
+        us = self.turn
+        them = not us
+        code = mailbox[from_square]
+        captured = mailbox[to_square]
+
+        ply = self.ply
+        self._moves[ply] = move
+        self._captured[ply] = captured
+        self._castling[ply] = self.castling
+        self._ep_square[ply] = self.ep_square
+        self._ep_key[ply] = self.ep_key
+        self._halfmove[ply] = self.halfmove_clock
+        self._key[ply] = self.key
+        self._score[ply] = self.score
+
+        key = self.key ^ ZOBRIST_TURN ^ ZOBRIST_CASTLING[self.castling] ^ self.ep_key
+        score = self.score
+        from_bb = BB_SQUARES[from_square]
+        to_bb = BB_SQUARES[to_square]
+        halfmove_clock = self.halfmove_clock + 1
+
+        if captured:
+            bbs[captured] ^= to_bb
+            occupied_co[them] ^= to_bb
+            key ^= ZOBRIST_PIECE[captured][to_square]
+            score -= PIECE_SCORE[captured][to_square]
+            halfmove_clock = 0
+
+        new_code = code if not promotion else promotion | (code & BLACK_OFFSET)
+        bbs[code] ^= from_bb
+        bbs[new_code] ^= to_bb
+        mailbox[from_square] = 0
+        mailbox[to_square] = new_code
+        occupied_co[us] ^= from_bb | to_bb
+        key ^= ZOBRIST_PIECE[code][from_square] ^ ZOBRIST_PIECE[new_code][to_square]
+        score += PIECE_SCORE[new_code][to_square] - PIECE_SCORE[code][from_square]
+
+        ep_square = None
+        piece_type = code & 7
+        if piece_type == PAWN:
+            halfmove_clock = 0
+            if to_square == self.ep_square and not captured:
+                # En passant: the captured pawn is behind the target square
+                captured_square = to_square - 8 if us == chess.WHITE else to_square + 8
+                captured_code = code ^ BLACK_OFFSET
+                captured_bb = BB_SQUARES[captured_square]
+                bbs[captured_code] ^= captured_bb
+                occupied_co[them] ^= captured_bb
+                mailbox[captured_square] = 0
+                key ^= ZOBRIST_PIECE[captured_code][captured_square]
+                score -= PIECE_SCORE[captured_code][captured_square]
+            elif to_square - from_square in (16, -16):
+                ep_square = (from_square + to_square) >> 1
+        elif piece_type == KING and to_square - from_square in (2, -2):
+            # Castling: move the rook as well
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            rook = ROOK | (code & BLACK_OFFSET)
+            rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            bbs[rook] ^= rook_bb
+            occupied_co[us] ^= rook_bb
+            mailbox[rook_from] = 0
+            mailbox[rook_to] = rook
+            key ^= ZOBRIST_PIECE[rook][rook_from] ^ ZOBRIST_PIECE[rook][rook_to]
+            score += PIECE_SCORE[rook][rook_to] - PIECE_SCORE[rook][rook_from]
+
+        castling = self.castling & CASTLING_MASK[from_square] & CASTLING_MASK[to_square]
+        self.castling = castling
+        self.occupied = occupied_co[0] | occupied_co[1]
+        self.turn = them
+        ep_key = 0
+        if ep_square is not None:
+            ep_key = self._ep_key_for(ep_square, them)
+        self.ep_square = ep_square
+        self.ep_key = ep_key
+        self.key = key ^ ZOBRIST_CASTLING[castling] ^ ep_key
+        self.score = score
+        self.halfmove_clock = halfmove_clock
+        if us == chess.BLACK:
+            self.fullmove_number += 1
+        self.ply = ply + 1
+        self.keys[self.history + ply + 1] = self.key
+
+    def pop(self):
+        ply = self.ply - 1
+        self.ply = ply
+        move = self._moves[ply]
+        from_square = move & 63
+        to_square = (move >> 6) & 63
+        mailbox = self.mailbox
+        bbs = self.bbs
+        occupied_co = self.occupied_co
+        them = self.turn
+        us = not them
+        self.turn = us
+        if us == chess.BLACK:
+            self.fullmove_number -= 1
+
+        moved = mailbox[to_square]
+        code = PAWN | (moved & BLACK_OFFSET) if move >> 12 else moved
+        captured = self._captured[ply]
+        from_bb = BB_SQUARES[from_square]
+        to_bb = BB_SQUARES[to_square]
+        bbs[moved] ^= to_bb
+        bbs[code] ^= from_bb
+        mailbox[from_square] = code
+        mailbox[to_square] = captured
+        occupied_co[us] ^= from_bb | to_bb
+        if captured:
+            bbs[captured] ^= to_bb
+            occupied_co[them] ^= to_bb
+
+        piece_type = code & 7
+        if piece_type == PAWN:
+            if not captured and (from_square - to_square) & 7:
+                # Undo en passant
+                captured_square = to_square - 8 if us == chess.WHITE else to_square + 8
+                captured_code = code ^ BLACK_OFFSET
+                captured_bb = BB_SQUARES[captured_square]
+                bbs[captured_code] ^= captured_bb
+                occupied_co[them] ^= captured_bb
+                mailbox[captured_square] = captured_code
+        elif piece_type == KING and to_square - from_square in (2, -2):
+            if to_square > from_square:
+                rook_from, rook_to = to_square + 1, to_square - 1
+            else:
+                rook_from, rook_to = to_square - 2, to_square + 1
+            rook = ROOK | (code & BLACK_OFFSET)
+            rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            bbs[rook] ^= rook_bb
+            occupied_co[us] ^= rook_bb
+            mailbox[rook_to] = 0
+            mailbox[rook_from] = rook
+
+        self.occupied = occupied_co[0] | occupied_co[1]
+        self.castling = self._castling[ply]
+        self.ep_square = self._ep_square[ply]
+        self.ep_key = self._ep_key[ply]
+        self.halfmove_clock = self._halfmove[ply]
+        self.key = self._key[ply]
+        self.score = self._score[ply]
+        return move
+
+    def push_null(self):
+        # Passes the turn, for null-move pruning. The fifty-move counter restarts so
+        # repetition checks never look back across the null move
+        ply = self.ply
+        self._moves[ply] = 0
+        self._captured[ply] = 0
+        self._castling[ply] = self.castling
+        self._ep_square[ply] = self.ep_square
+        self._ep_key[ply] = self.ep_key
+        self._halfmove[ply] = self.halfmove_clock
+        self._key[ply] = self.key
+        self._score[ply] = self.score
+        self.key ^= ZOBRIST_TURN ^ self.ep_key
+        self.ep_square = None
+        self.ep_key = 0
+        self.halfmove_clock = 0
+        self.turn = not self.turn
+        self.ply = ply + 1
+        self.keys[self.history + ply + 1] = self.key
+
+    def pop_null(self):
+        ply = self.ply - 1
+        self.ply = ply
+        self.turn = not self.turn
+        self.ep_square = self._ep_square[ply]
+        self.ep_key = self._ep_key[ply]
+        self.halfmove_clock = self._halfmove[ply]
+        self.key = self._key[ply]
+
+    def has_non_pawn_material(self, color):
+        # Knights, bishops, rooks or queens; without them zugzwang is likely
+        offset = 0 if color == chess.WHITE else BLACK_OFFSET
+        bbs = self.bbs
+        return bool(bbs[KNIGHT + offset] | bbs[BISHOP + offset] | bbs[ROOK + offset] | bbs[QUEEN + offset])
+
+    def pseudo_legal_moves(self, captures_only=False):
+        # Pseudo-legal moves of the side to move; with captures_only just captures and
+        # queen promotions, as needed by quiescence search
+        moves = []
+        append = moves.append
+        us = self.turn
+        offset = 0 if us == chess.WHITE else BLACK_OFFSET
+        bbs = self.bbs
+        own = self.occupied_co[us]
+        enemy = self.occupied_co[not us]
+        occupied = self.occupied
+        targets = enemy if captures_only else chess.BB_ALL & ~own
+
+        # Pawns, all pawns at once with shifts: (targets, to_square - from_square) pairs
+        pawns = bbs[PAWN + offset]
+        empty = chess.BB_ALL & ~occupied
+        capture_targets = enemy
+        if self.ep_square is not None:
+            capture_targets |= BB_SQUARES[self.ep_square]
+        if us == chess.WHITE:
+            single = (pawns << 8) & empty
+            double = ((single & chess.BB_RANK_3) << 8) & empty
+            left = ((pawns & ~chess.BB_FILE_A) << 7) & capture_targets
+            right = ((pawns & ~chess.BB_FILE_H) << 9) & capture_targets
+            last_rank = chess.BB_RANK_8
+            steps = ((left, 7), (right, 9), (single, 8), (double, 16))
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & chess.BB_RANK_6) >> 8) & empty
+            left = ((pawns & ~chess.BB_FILE_A) >> 9) & capture_targets
+            right = ((pawns & ~chess.BB_FILE_H) >> 7) & capture_targets
+            last_rank = chess.BB_RANK_1
+            steps = ((left, -9), (right, -7), (single, -8), (double, -16))
+        promotions = PROMOTION_PIECES[:1] if captures_only else PROMOTION_PIECES
+        for to_mask, step in steps:
+            promoting = to_mask & last_rank
+            while promoting:
+                to_square = (promoting & -promoting).bit_length() - 1
+                promoting &= promoting - 1
+                for promotion in promotions:
+                    append((to_square - step) | to_square << 6 | promotion << 12)
+            if captures_only and step in (8, -8, 16, -16):
+                continue
+            to_mask &= ~last_rank
+            while to_mask:
+                to_square = (to_mask & -to_mask).bit_length() - 1
+                to_mask &= to_mask - 1
+                append((to_square - step) | to_square << 6)
+
+        # Pieces
+        pieces = bbs[KNIGHT + offset]
+        while pieces:
+            from_square = (pieces & -pieces).bit_length() - 1
+            pieces &= pieces - 1
+            attacks = KNIGHT_ATTACKS[from_square] & targets
+            while attacks:
+                to_square = (attacks & -attacks).bit_length() - 1
+                attacks &= attacks - 1
+                append(from_square | to_square << 6)
+        queens = bbs[QUEEN + offset]
+        pieces = bbs[BISHOP + offset] | queens
+        while pieces:
+            from_square = (pieces & -pieces).bit_length() - 1
+            pieces &= pieces - 1
+            attacks = DIAG_ATTACKS[from_square][occupied & DIAG_MASKS[from_square]] & targets
+            while attacks:
+                to_square = (attacks & -attacks).bit_length() - 1
+                attacks &= attacks - 1
+                append(from_square | to_square << 6)
+        pieces = bbs[ROOK + offset] | queens
+        while pieces:
+            from_square = (pieces & -pieces).bit_length() - 1
+            pieces &= pieces - 1
+            attacks = (RANK_ATTACKS[from_square][occupied & RANK_MASKS[from_square]] |
+                       FILE_ATTACKS[from_square][occupied & FILE_MASKS[from_square]]) & targets
+            while attacks:
+                to_square = (attacks & -attacks).bit_length() - 1
+                attacks &= attacks - 1
+                append(from_square | to_square << 6)
+        king_square = (bbs[KING + offset] & -bbs[KING + offset]).bit_length() - 1
+        attacks = KING_ATTACKS[king_square] & targets
+        while attacks:
+            to_square = (attacks & -attacks).bit_length() - 1
+            attacks &= attacks - 1
+            append(king_square | to_square << 6)
+
+        # Castling, only through empty squares that are not attacked
+        if not captures_only and self.castling:
+            them = not us
+            if us == chess.WHITE:
+                king_square, kingside, queenside = chess.E1, WHITE_KINGSIDE, WHITE_QUEENSIDE
+            else:
+                king_square, kingside, queenside = chess.E8, BLACK_KINGSIDE, BLACK_QUEENSIDE
+            if self.castling & (kingside | queenside) and not self.attackers_mask(them, king_square):
+                if (self.castling & kingside and not occupied & (BB_SQUARES[king_square + 1] | BB_SQUARES[king_square + 2])
+                        and not self.attackers_mask(them, king_square + 1)
+                        and not self.attackers_mask(them, king_square + 2)):
+                    append(king_square | (king_square + 2) << 6)
+                if (self.castling & queenside
+                        and not occupied & (BB_SQUARES[king_square - 1] | BB_SQUARES[king_square - 2] | BB_SQUARES[king_square - 3])
+                        and not self.attackers_mask(them, king_square - 1)
+                        and not self.attackers_mask(them, king_square - 2)):
+                    append(king_square | (king_square - 2) << 6)
+        return moves
+
+    def pinned_mask(self, color):
+        # Pieces of color that cannot leave the line between their king and an enemy slider
+        king_square = self.king(color)
+        offset = BLACK_OFFSET if color == chess.WHITE else 0
+        bbs = self.bbs
+        queens = bbs[QUEEN + offset]
+        snipers = ((rook_attacks(king_square, 0) & (bbs[ROOK + offset] | queens)) |
+                   (bishop_attacks(king_square, 0) & (bbs[BISHOP + offset] | queens)))
+        own = self.occupied_co[color]
+        pinned = 0
+        while snipers:
+            sniper = lsb(snipers)
+            snipers &= snipers - 1
+            blockers = BETWEEN[king_square][sniper] & self.occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+        return pinned
+
+    def legal_moves(self, captures_only=False):
+        return list(self.generate_legal_moves(captures_only))
+
+    def has_legal_moves(self):
+        # Usually the king alone has a safe square, which avoids generating every move
+        us = self.turn
+        them = not us
+        king_square = self.king(us)
+        without_king = self.occupied ^ BB_SQUARES[king_square]
+        squares = KING_ATTACKS[king_square] & ~self.occupied_co[us]
+        while squares:
+            square = (squares & -squares).bit_length() - 1
+            squares &= squares - 1
+            if not self.attackers_mask(them, square, without_king):
+                return True
+        for _ in self.generate_legal_moves():
+            return True
+        return False
+
+    def generate_legal_moves(self, captures_only=False):
+        moves = self.pseudo_legal_moves(captures_only)
+        us = self.turn
+        them = not us
+        king_square = self.king(us)
+        in_check = self.attackers_mask(them, king_square)
+        pinned = self.pinned_mask(us)
+        for move in moves:
+            from_square = move & 63
+            if from_square == king_square:
+                to_square = (move >> 6) & 63
+                # Castling was checked while generating; the king must not step into an attack
+                if to_square - from_square in (2, -2) or not self.attackers_mask(
+                        them, to_square, self.occupied ^ BB_SQUARES[from_square]):
+                    yield move
+            elif in_check or pinned & BB_SQUARES[from_square] or self.is_en_passant(move):
+                # Rare cases are simply tried out
+                self.push(move)
+                legal = not self.attackers_mask(them, king_square)
+                self.pop()
+                if legal:
+                    yield move
+            else:
+                yield move
+
+    def is_insufficient_material(self):
+        bbs = self.bbs
+        if (bbs[PAWN] | bbs[PAWN + BLACK_OFFSET] | bbs[ROOK] | bbs[ROOK + BLACK_OFFSET] |
+                bbs[QUEEN] | bbs[QUEEN + BLACK_OFFSET]):
+            return False
+        knights = bbs[KNIGHT] | bbs[KNIGHT + BLACK_OFFSET]
+        bishops = bbs[BISHOP] | bbs[BISHOP + BLACK_OFFSET]
+        if popcount(knights | bishops) <= 1:
+            return True
+        # Only bishops, all on squares of one colour
+        return not knights and (not bishops & chess.BB_DARK_SQUARES or not bishops & chess.BB_LIGHT_SQUARES)
+
+    def repetitions(self):
+        # How many times the current position occurred, counting this one
+        keys = self.keys
+        current = self.history + self.ply
+        key = keys[current]
+        count = 1
+        oldest = max(0, current - self.halfmove_clock)
+        for i in range(current - 4, oldest - 1, -2):
+            if keys[i] == key:
+                count += 1
+        return count
+
+    def is_repeated(self, root_ply):
+        # Repetition test of the search: the position already occurred inside the search
+        # tree (from root_ply on), or twice before it in the game. Only positions since the
+        # last capture or pawn move can repeat, the key stack gives them in O(ply).
+        keys = self.keys
+        current = self.history + self.ply
+        key = keys[current]
+        root = self.history + root_ply
+        oldest = max(0, current - self.halfmove_clock)
+        count = 0
+        for i in range(current - 4, oldest - 1, -2):
+            if keys[i] == key:
+                if i >= root:
+                    return True
+                count += 1
+                if count == 2:
+                    return True
+        return False
+
+    def is_repetition(self, count=3):
+        return self.repetitions() >= count
@@ -0,0 +1,106 @@
+import argparse
+import cProfile
+import functools
+import io
+import pstats
+import time
+import chess
+import chess_ai
+from transposition import TranspositionTable
+
+# Profiling hooks for the search. timed() swaps the hot functions of chess_ai for
+# wrappers that count calls and time spent, profile_search() runs a search under
+# cProfile. Neither costs anything unless it is used.
+#
+#   python profiling.py --depth 4 --fen "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10"
+
+# chess_ai functions wrapped by timed(); they call each other through the module
+# globals, so replacing the globals is enough to see every call
+HOT_FUNCTIONS = ("negamax", "quiescence", "static_score", "order_moves",
+                 "static_exchange", "mvv_lva")
+
+
+class FunctionTimer:
+    """Calls and inclusive seconds of every wrapped function, filled in while timed() is active."""
+
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+
+    def wrap(self, name, function):
+        self.calls[name] = 0
+        self.seconds[name] = 0.0
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.calls[name] += 1
+                self.seconds[name] += time.perf_counter() - start
+        return wrapper
+
+    def report(self):
+        # Recursive functions count their children too, so the seconds do not add up
+        lines = [f"{'function':<22}{'calls':>10}{'seconds':>10}{'us/call':>10}"]
+        for name in sorted(self.calls, key=self.seconds.get, reverse=True):
+            calls = self.calls[name]
+            per_call = self.seconds[name] / calls * 1e6 if calls else 0.0
+            lines.append(f"{name:<22}{calls:>10}{self.seconds[name]:>10.3f}{per_call:>10.1f}")
+        return "\n".join(lines)
+
+
+class timed:
+    """Context manager that times the chess_ai hot functions while it is active.
+
+        with timed() as timer:
+            chess_ai.iterative_deepening(board, 4)
+        print(timer.report())
+    """
+
+    def __init__(self, names=HOT_FUNCTIONS):
+        self.names = names
+        self.timer = FunctionTimer()
+        self.originals = {}
+
+    def __enter__(self):
+        for name in self.names:
+            self.originals[name] = getattr(chess_ai, name)
+            setattr(chess_ai, name, self.timer.wrap(name, self.originals[name]))
+        return self.timer
+
+    def __exit__(self, *exc):
+        for name, function in self.originals.items():
+            setattr(chess_ai, name, function)
+        self.originals = {}
+        return False
+
+
+def profile_search(fen, depth, sort="cumulative", limit=25):
+    # Runs a search from a cold table under cProfile and returns the printed stats
+    board = chess.Board(fen)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    chess_ai.iterative_deepening(board, depth, tt=TranspositionTable())
+    profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the search")
+    parser.add_argument("--fen", default=chess.STARTING_FEN)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--cprofile", action="store_true", help="full cProfile output instead of the function timers")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key for --cprofile")
+    args = parser.parse_args()
+
+    if args.cprofile:
+        print(profile_search(args.fen, args.depth, args.sort))
+    else:
+        with timed() as timer:
+            chess_ai.iterative_deepening(chess.Board(args.fen), args.depth, tt=TranspositionTable(),
+                                         on_iteration=print)
+        print(timer.report())
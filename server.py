@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+import chess
+import chess_ai
+from chess_ai import INFINITE, MATE_SCORE, MAX_DEPTH, Search, SearchAborted, iterative_deepening, negamax, principal_variation
+from position import Position, encode_move
+from timecontrol import SearchLimits
+
+# Local HTTP/JSON analysis service on asyncio. Searches run in a pool of worker processes,
+# each keeping its own transposition table (chess_ai.TRANSPOSITION_TABLE) warm between
+# requests. Requests beyond the pool size wait in a bounded queue.
+#
+#   python server.py --port 8080 --workers 4
+#   curl 'localhost:8080/bestmove?fen=...&movetime=1'
+#   curl -d '{"fen": "...", "depth": 6, "multipv": 3}' localhost:8080/analyze
+#   curl localhost:8080/metrics
+
+DEFAULT_TIMEOUT = 30.0  # seconds, also the longest a search may run
+DEFAULT_DEPTH = 6
+MAX_MULTIPV = 10
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_MAX_QUEUE = 64
+LATENCY_SAMPLES = 1000  # latencies kept for the percentiles
+MAX_BODY = 65536
+
+
+def _score(value, turn, pv_length):
+    # White-relative search score to UCI-style {"cp": ...} or {"mate": ...} for the side to move
+    if turn == chess.BLACK:
+        value = -value
+    if abs(value) >= MATE_SCORE:
+        moves = (pv_length + 1) // 2 or 1
+        return {"mate": moves if value > 0 else -moves}
+    return {"cp": int(value)}
+
+
+def _analyze(fen, depth, movetime, multipv):
+    # Runs in a worker process: searches the position and returns a JSON-ready result
+    board = chess.Board(fen)
+    search = Search(SearchLimits(movetime=movetime))
+    start = time.perf_counter()
+    move = iterative_deepening(board, depth, search=search)
+    result = {"fen": fen, "depth": search.completed_depth, "nodes": search.nodes, "lines": []}
+    if move is None:
+        result["time"] = round(time.perf_counter() - start, 3)
+        return result
+    pv = search.iterations[-1].pv if search.iterations else [move]
+    lines = [{"move": move.uci(), "score": _score(search.best_score or 0, board.turn, len(pv)),
+              "pv": [pv_move.uci() for pv_move in pv]}]
+    if multipv > 1 and search.completed_depth > 1:
+        lines = _multipv_lines(board, move, search, multipv, movetime, start) or lines
+        result["nodes"] = search.nodes
+    result["lines"] = lines
+    result["time"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _multipv_lines(board, best_move, search, multipv, movetime, start):
+    # Scores the root moves one ply shallower than the main search, which left the table
+    # warm, and returns the best multipv lines; None if the time ran out first. A move only
+    # has to be searched exactly if it beats the worst of the best multipv found so far.
+    pos = Position.from_board(board)
+    tt = chess_ai.TRANSPOSITION_TABLE
+    remaining = None if movetime is None else max(0.0, movetime - (time.perf_counter() - start))
+    line_search = Search(SearchLimits(movetime=remaining))
+    line_search.start(pos, tt)
+    best = encode_move(best_move)
+    moves = pos.legal_moves()
+    moves.remove(best)
+    scored = []
+    try:
+        for move in [best] + moves:
+            alpha = scored[multipv - 1][0] if len(scored) >= multipv else -INFINITE
+            pos.push(move)
+            value = -negamax(pos, search.completed_depth - 1, -INFINITE, -alpha, tt, line_search)[0]
+            pos.pop()
+            if value > alpha:
+                scored.append((value, move))
+                scored.sort(key=lambda item: item[0], reverse=True)
+    except SearchAborted:
+        return None
+    finally:
+        search.nodes += line_search.nodes
+    lines = []
+    sign = 1 if board.turn == chess.WHITE else -1
+    for value, move in scored[:multipv]:
+        pv = principal_variation(pos, tt, move, search.completed_depth)
+        lines.append({"move": pv[0].uci(), "score": _score(sign * value, board.turn, len(pv)),
+                      "pv": [pv_move.uci() for pv_move in pv]})
+    return lines
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AnalysisServer:
+    """Request handling, queueing, result cache and metrics of the analysis service."""
+
+    def __init__(self, workers=1, cache_size=DEFAULT_CACHE_SIZE, max_queue=DEFAULT_MAX_QUEUE,
+                 timeout=DEFAULT_TIMEOUT):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.slots = asyncio.Semaphore(workers)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.cache = OrderedDict()  # (fen, depth, multipv) -> result, least recently used first
+        self.cache_size = cache_size
+        self.queued = 0
+        self.running = 0
+        self.requests = 0
+        self.cache_hits = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.search_nodes = 0
+        self.search_seconds = 0.0
+
+    async def analyze(self, params):
+        fen = params.get("fen") or chess.STARTING_FEN
+        if not isinstance(fen, str):
+            raise HttpError(400, "fen must be a string")
+        try:
+            board = chess.Board(fen)
+            depth = int(params["depth"]) if params.get("depth") is not None else None
+            movetime = float(params["movetime"]) if params.get("movetime") is not None else None
+            multipv = int(params.get("multipv", 1))
+            timeout = float(params.get("timeout", self.timeout))
+        except (ValueError, TypeError) as e:
+            raise HttpError(400, str(e))
+        if not board.is_valid():
+            raise HttpError(400, f"illegal position: {fen}")
+        if depth is not None and not 1 <= depth <= MAX_DEPTH:
+            raise HttpError(400, f"depth must be between 1 and {MAX_DEPTH}")
+        if movetime is not None and movetime <= 0:
+            raise HttpError(400, "movetime must be positive")
+        multipv = max(1, min(MAX_MULTIPV, multipv))
+        timeout = max(0.1, min(self.timeout, timeout))
+        if depth is None and movetime is None:
+            depth = DEFAULT_DEPTH
+        fen = board.fen()
+
+        # Only fixed-depth results are repeatable, timed ones are never cached
+        key = (fen, depth, multipv) if movetime is None else None
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+            return dict(self.cache[key], cached=True)
+
+        if self.queued >= self.max_queue:
+            raise HttpError(503, "queue full")
+        self.queued += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        try:
+            # The search itself stops at the timeout, the extra second covers the process round trip
+            search_time = timeout if movetime is None else min(movetime, timeout)
+            future = asyncio.get_running_loop().run_in_executor(
+                self.pool, _analyze, fen, depth or MAX_DEPTH, search_time, multipv)
+            result = await asyncio.wait_for(future, timeout + 1.0)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HttpError(504, "analysis timed out")
+        finally:
+            self.running -= 1
+            self.slots.release()
+        self.search_nodes += result["nodes"]
+        self.search_seconds += result["time"]
+        # A search cut short by the timeout, or a multipv pass that ran out of time and fell
+        # back to one line, is not what the key asks for and is not cached
+        if (key is not None and result["depth"] >= depth and
+                len(result["lines"]) >= min(multipv, board.legal_moves.count())):
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return dict(result, cached=False)
+
+    async def bestmove(self, params):
+        result = await self.analyze(dict(params, multipv=1))
+        if not result["lines"]:
+            return {"fen": result["fen"], "bestmove": None, "ponder": None}
+        line = result["lines"][0]
+        return {"fen": result["fen"], "bestmove": line["move"],
+                "ponder": line["pv"][1] if len(line["pv"]) > 1 else None, "score": line["score"],
+                "depth": result["depth"], "cached": result["cached"]}
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 1)
+
+        return {
+            "queue_depth": self.queued,
+            "running": self.running,
+            "workers": self.workers,
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self.cache),
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "latency_ms": {"p50": percentile(50), "p90": percentile(90), "p99": percentile(99)},
+            "nodes_per_sec": round(self.search_nodes / self.search_seconds) if self.search_seconds else 0,
+        }
+
+    async def handle(self, reader, writer):
+        # One request per connection: parse, dispatch, answer with JSON and close
+        start = time.perf_counter()
+        status, body = 200, None
+        try:
+            method, path, params = await read_request(reader)
+            route = urlsplit(path).path.rstrip("/")
+            if route == "/metrics":
+                body = self.metrics()
+            elif route in ("/analyze", "/bestmove"):
+                self.requests += 1
+                body = await (self.analyze(params) if route == "/analyze" else self.bestmove(params))
+                self.latencies.append(time.perf_counter() - start)
+            else:
+                raise HttpError(404, f"no such endpoint: {route}")
+        except HttpError as e:
+            status, body = e.status, {"error": str(e)}
+            self.errors += status != 404
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception:
+            # A bug rather than a bad request: log it, answer 500 and keep serving
+            traceback.print_exc()
+            status, body = 500, {"error": "internal server error"}
+            self.errors += 1
+        try:
+            await write_response(writer, status, body)
+        except ConnectionError:
+            pass
+
+
+async def read_request(reader):
+    # Returns (method, path, params) with the parameters of the query string and a JSON body merged
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) < 2:
+        raise HttpError(400, "bad request line")
+    method, path = request_line[0].upper(), request_line[1]
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    params = {name: values[-1] for name, values in parse_qs(urlsplit(path).query).items()}
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "invalid Content-Length")
+    if length < 0:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "request body too large")
+    if length:
+        try:
+            body = json.loads(await reader.readexactly(length))
+        except ValueError:
+            raise HttpError(400, "body is not valid JSON")
+        if not isinstance(body, dict):
+            raise HttpError(400, "body must be a JSON object")
+        params.update(body)
+    return method, path, params
+
+
+async def write_response(writer, status, body):
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+               500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+    data = json.dumps(body).encode()
+    writer.write(f"HTTP/1.1 {status} {reasons.get(status, 'Error')}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+    try:
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(host, port, **options):
+    server = AnalysisServer(**options)
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f"Analysis server on http://{host}:{port} with {server.workers} workers", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/JSON position analysis service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="results kept in the cache")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE, help="requests allowed to wait")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="longest time per request, seconds")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, cache_size=args.cache_size,
+                          max_queue=args.max_queue, timeout=args.timeout))
+    except KeyboardInterrupt:
+        pass
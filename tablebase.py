@@ -0,0 +1,127 @@
+import os
+from collections import OrderedDict
+import chess
+import chess.syzygy
+from position import popcount
+
+# Optional Syzygy endgame tablebases. Without table files every probe is skipped, so the
+# search pays nothing for them. python-chess opens the table files on first use and keeps
+# at most max_fds of them open. Results are kept in an LRU cache keyed on the Zobrist key.
+
+DEFAULT_CACHE_SIZE = 65536
+
+# Score of a won tablebase position, below MATE_SCORE so real mates are still preferred
+TB_WIN_SCORE = 90000
+
+# WDL (2 win, 1 win spoiled by the fifty-move rule, 0 draw, -1 and -2 the same for losses)
+# to score for the side to move
+WDL_SCORES = {2: TB_WIN_SCORE, 1: 1, 0: 0, -1: -1, -2: -TB_WIN_SCORE}
+
+
+class Tablebase:
+    """Syzygy WDL/DTZ tables found in one or more directories.
+
+    score() gives the exact score of a position inside the search, root_move() picks
+    the best move of a root position by WDL and DTZ. probes, hits and cache_hits count
+    what the tables were asked.
+    """
+
+    def __init__(self, paths=(), cache_size=DEFAULT_CACHE_SIZE, max_fds=128):
+        self.cache_size = cache_size
+        self.max_fds = max_fds
+        self.tables = chess.syzygy.Tablebase(max_fds=max_fds)
+        self.paths = []
+        self.max_pieces = 0  # most pieces (kings included) of any table found, 0 without tables
+        self.cache = OrderedDict()
+        self.reset_stats()
+        for path in paths:
+            self.add_directory(path)
+
+    def add_directory(self, path):
+        # Returns the number of tables found in the directory
+        found = self.tables.add_directory(path)
+        self.paths.append(path)
+        # Table names look like "KQvKR"
+        self.max_pieces = max([len(name) - 1 for name in self.tables.wdl] + [0])
+        return found
+
+    def configure(self, paths):
+        # Replaces the table directories, paths is a list or an os.pathsep separated string
+        if isinstance(paths, str):
+            paths = [path for path in paths.split(os.pathsep) if path and path != "<empty>"]
+        self.close()
+        self.tables = chess.syzygy.Tablebase(max_fds=self.max_fds)
+        self.paths = []
+        self.max_pieces = 0
+        self.cache.clear()
+        for path in paths:
+            self.add_directory(path)
+
+    def close(self):
+        self.tables.close()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.cache_hits = 0
+
+    def can_probe(self, pos):
+        # Tables have no castling rights and at most max_pieces pieces
+        return not pos.castling and popcount(pos.occupied) <= self.max_pieces
+
+    def probe_wdl(self, pos):
+        # WDL of a Position from the side to move's point of view, None when not in the tables
+        self.probes += 1
+        key = pos.key
+        if key in self.cache:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        wdl = self.tables.get_wdl(pos.to_board())
+        if wdl is not None:
+            self.hits += 1
+        self.cache[key] = wdl
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return wdl
+
+    def score(self, pos):
+        # Exact score from White's point of view like the rest of the search, or None
+        wdl = self.probe_wdl(pos)
+        if wdl is None:
+            return None
+        score = WDL_SCORES[wdl]
+        return score if pos.turn == chess.WHITE else -score
+
+    def root_move(self, board):
+        # Best move of a chess.Board in the tables or None: mates first, then by WDL, wins
+        # taking the fewest plies to the next capture or pawn move (DTZ), losses the most
+        if not self.max_pieces or board.castling_rights or chess.popcount(board.occupied) > self.max_pieces:
+            return None
+        best_move, best_rank = None, None
+        for move in board.legal_moves:
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    rank = (3, 0)
+                else:
+                    wdl = self.tables.get_wdl(board)
+                    dtz = self.tables.get_dtz(board)
+                    if wdl is None or dtz is None:
+                        return None
+                    self.probes += 1
+                    self.hits += 1
+                    rank = (-wdl, -abs(dtz) if wdl < 0 else abs(dtz))
+            finally:
+                board.pop()
+            if best_rank is None or rank > best_rank:
+                best_move, best_rank = move, rank
+        return best_move
+
+    def stats(self):
+        return {"probes": self.probes, "hits": self.hits, "cache_hits": self.cache_hits,
+                "cached": len(self.cache), "max_pieces": self.max_pieces}
+
+
+# Shared by every search in the process, configured with TABLEBASE.configure(paths)
+TABLEBASE = Tablebase()
@@ -0,0 +1,78 @@
+import random
+import unittest
+import chess
+import chess.polyglot
+from position import Position, decode_move, encode_move
+
+# Standard perft positions with their node counts at depths 1 to 3
+PERFT_POSITIONS = [
+    (chess.STARTING_FEN, [20, 400, 8902]),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", [48, 2039, 97862]),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", [14, 191, 2812]),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", [6, 264, 9467]),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", [44, 1486, 62379]),
+    ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", [46, 2079, 89890]),
+]
+
+RANDOM_GAMES = 200
+MAX_GAME_PLIES = 200
+
+
+def perft(pos, depth):
+    moves = pos.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        pos.push(move)
+        nodes += perft(pos, depth - 1)
+        pos.pop()
+    return nodes
+
+
+class PositionTest(unittest.TestCase):
+    """Checks the search's own move generator and make/unmake against python-chess."""
+
+    def test_perft(self):
+        for fen, counts in PERFT_POSITIONS:
+            pos = Position.from_fen(fen)
+            for depth, count in enumerate(counts, 1):
+                self.assertEqual(perft(pos, depth), count, f"perft {depth} of {fen}")
+            # push/pop leaves the position as it was
+            self.assertEqual(pos.fen(), chess.Board(fen).fen())
+            self.assertEqual(pos.key, chess.polyglot.zobrist_hash(chess.Board(fen)))
+
+    def test_random_games(self):
+        rng = random.Random(1)
+        for game in range(RANDOM_GAMES):
+            board = chess.Board()
+            pos = Position.from_board(board)
+            while not board.is_game_over() and board.ply() < MAX_GAME_PLIES:
+                self.assert_same(pos, board)
+                move = rng.choice(list(board.legal_moves))
+                board.push(move)
+                pos.push(encode_move(move))
+            self.assert_same(pos, board)
+            # Unmaking every move gets back to the start with the same key
+            while board.move_stack:
+                board.pop()
+                pos.pop()
+            self.assertEqual(pos.key, chess.polyglot.zobrist_hash(board))
+            self.assertEqual(pos.fen(), board.fen())
+
+    def assert_same(self, pos, board):
+        fen = board.fen()
+        self.assertEqual(pos.fen(), fen)
+        self.assertEqual(pos.key, chess.polyglot.zobrist_hash(board), fen)
+        self.assertEqual({decode_move(move) for move in pos.legal_moves()}, set(board.legal_moves), fen)
+        # Captures and queen promotions, what quiescence search looks at
+        captures = {move for move in board.legal_moves
+                    if move.promotion in (None, chess.QUEEN) and (board.is_capture(move) or move.promotion)}
+        self.assertEqual({decode_move(move) for move in pos.legal_moves(captures_only=True)}, captures, fen)
+        self.assertEqual(pos.is_check(), board.is_check(), fen)
+        self.assertEqual(pos.has_legal_moves(), any(board.legal_moves), fen)
+        self.assertEqual(pos.is_insufficient_material(), board.is_insufficient_material(), fen)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import asyncio
+import unittest
+from server import AnalysisServer, HttpError
+
+
+class AnalysisServerTest(unittest.TestCase):
+    """Calls the request handlers of the analysis server directly, without HTTP."""
+
+    def run_server(self, handler, *requests):
+        # Runs every request on one server in turn and returns their results
+        async def run():
+            server = AnalysisServer()
+            try:
+                return [await getattr(server, handler)(params) for params in requests]
+            finally:
+                server.pool.shutdown()
+        return asyncio.run(run())
+
+    def test_movetime_only(self):
+        result, = self.run_server("analyze", {"movetime": "0.3"})
+        self.assertGreaterEqual(result["depth"], 1)
+        self.assertEqual(len(result["lines"]), 1)
+        self.assertFalse(result["cached"])
+
+    def test_bestmove_movetime(self):
+        fen = "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"
+        result, = self.run_server("bestmove", {"fen": fen, "movetime": "1"})
+        self.assertEqual(result["bestmove"], "h5f7")
+
+    def test_fixed_depth_is_cached(self):
+        first, second = self.run_server("analyze", {"depth": "3", "multipv": "2"}, {"depth": "3", "multipv": "2"})
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(len(second["lines"]), 2)
+
+    def test_bad_request(self):
+        with self.assertRaises(HttpError) as error:
+            self.run_server("analyze", {"fen": 5})
+        self.assertEqual(error.exception.status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class UciPipeTest(unittest.TestCase):
+    """Drives uci.py through piped stdin like a GUI does."""
+
+    def run_engine(self, commands, timeout=30):
+        # Sends the commands, waits for bestmove, then quits; returns every line printed
+        engine = subprocess.Popen([sys.executable, os.path.join(HERE, "uci.py")], cwd=HERE, text=True,
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True)
+        # A hung engine is killed together with its search workers, which closes the output
+        # and fails the test instead of blocking it
+        watchdog = threading.Timer(timeout, os.killpg, (engine.pid, signal.SIGKILL))
+        watchdog.start()
+        try:
+            for command in commands:
+                engine.stdin.write(command + "\n")
+            engine.stdin.flush()
+            lines = []
+            for line in engine.stdout:
+                lines.append(line.strip())
+                if line.startswith("bestmove"):
+                    break
+            engine.stdin.write("quit\n")
+            engine.stdin.flush()
+            engine.wait(timeout)
+        except BrokenPipeError:
+            pass
+        finally:
+            watchdog.cancel()
+            if engine.poll() is None:
+                os.killpg(engine.pid, signal.SIGKILL)
+        return lines
+
+    def test_go_depth(self):
+        lines = self.run_engine(["uci", "isready", "position startpos moves e2e4", "go depth 3"])
+        self.assertIn("uciok", lines)
+        self.assertIn("readyok", lines)
+        self.assertTrue(lines and lines[-1].startswith("bestmove "), "no bestmove")
+        self.assertTrue(any(line.startswith("info depth 3 ") for line in lines))
+
+    def test_go_with_threads(self):
+        # The worker pool is started while the main thread is blocked reading stdin
+        lines = self.run_engine(["setoption name Threads value 2", "go depth 3"])
+        self.assertTrue(lines and lines[-1].startswith("bestmove "), "no bestmove")
+        self.assertTrue(any(line.startswith("info depth 3 ") for line in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
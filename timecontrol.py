@@ -0,0 +1,47 @@
+import chess
+
+# Time kept in reserve for move overhead (GUI, process switching), in seconds
+MOVE_OVERHEAD = 0.05
+
+# Number of moves the remaining clock is spread over when the time control does not say
+DEFAULT_MOVES_TO_GO = 30
+
+
+class SearchLimits:
+    """Limits for one search. Times are in seconds, None means unlimited.
+
+    movetime        exact time to spend on the move
+    wtime, btime    remaining clock of each side, winc/binc their increments
+    movestogo       moves until the next time control (sudden death when None)
+    nodes           stop after this many nodes
+    depth           stop after this many plies
+    """
+
+    def __init__(self, movetime=None, wtime=None, btime=None, winc=0, binc=0,
+                 movestogo=None, nodes=None, depth=None):
+        self.movetime = movetime
+        self.wtime = wtime
+        self.btime = btime
+        self.winc = winc
+        self.binc = binc
+        self.movestogo = movestogo
+        self.nodes = nodes
+        self.depth = depth
+
+    def budget(self, turn):
+        # Returns (soft, hard) time limits for the side to move
+        # soft: do not start another iteration past this point
+        # hard: abort the running iteration past this point
+        if self.movetime is not None:
+            limit = max(0.0, self.movetime - MOVE_OVERHEAD)
+            return limit, limit
+        remaining = self.wtime if turn == chess.WHITE else self.btime
+        if remaining is None:
+            return None, None
+        increment = self.winc if turn == chess.WHITE else self.binc
+        moves_to_go = self.movestogo or DEFAULT_MOVES_TO_GO
+        usable = max(0.0, remaining - MOVE_OVERHEAD)
+        soft = min(usable, usable / moves_to_go + 0.75 * increment)
+        # Never bet more than a fraction of the clock on a single move
+        hard = min(usable * 0.5 if moves_to_go > 1 else usable, soft * 4)
+        return soft, max(soft, hard)
@@ -0,0 +1,96 @@
+# Bound types stored with every entry
+EXACT = 0  # score is the exact minimax value
+LOWER = 1  # search failed high, score is a lower bound
+UPPER = 2  # search failed low, score is an upper bound
+
+DEFAULT_SIZE_MB = 16
+
+# Rough size of one stored entry: the tuple itself, its ints and a share of the move object
+ENTRY_BYTES = 128
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results keyed by Zobrist hash.
+
+    Every bucket holds two slots: a depth-preferred slot that keeps the deepest
+    result of the current search, and an always-replace slot that takes
+    everything else. Entries are tuples of (key, depth, flag, score, move, age).
+    """
+
+    def __init__(self, size_mb=DEFAULT_SIZE_MB):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        self.size_mb = size_mb
+        self.buckets = max(1, int(size_mb * 1024 * 1024) // (2 * ENTRY_BYTES))
+        self.clear()
+
+    def clear(self):
+        self.slots = [None] * (2 * self.buckets)
+        self.age = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0  # misses where the bucket was occupied by other positions
+        self.stores = 0
+
+    def new_search(self):
+        # Called once per root search so entries from earlier moves lose depth priority
+        self.age += 1
+
+    def probe(self, key):
+        i = (key % self.buckets) * 2
+        slots = self.slots
+        entry = slots[i]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        other = slots[i + 1]
+        if other is not None and other[0] == key:
+            self.hits += 1
+            return other
+        self.misses += 1
+        if entry is not None or other is not None:
+            self.collisions += 1
+        return None
+
+    def peek(self, key):
+        # Like probe() but without counting, for reporting code such as PV extraction
+        i = (key % self.buckets) * 2
+        for entry in (self.slots[i], self.slots[i + 1]):
+            if entry is not None and entry[0] == key:
+                return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        i = (key % self.buckets) * 2
+        slots = self.slots
+        new = (key, depth, flag, score, move, self.age)
+        current = slots[i]
+        if (current is None or current[0] == key or depth >= current[1]
+                or current[5] != self.age):
+            # Keep a still-useful best move if the new result did not produce one
+            if move is None and current is not None and current[0] == key:
+                new = (key, depth, flag, score, current[4], self.age)
+            slots[i] = new
+        else:
+            slots[i + 1] = new
+        self.stores += 1
+
+    def usage(self):
+        # Fraction of slots filled, in per mille like the UCI hashfull figure
+        sample = self.slots[:2000]
+        return sum(1 for entry in sample if entry is not None) * 1000 // len(sample)
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "hashfull": self.usage(),
+        }
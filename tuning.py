@@ -0,0 +1,255 @@
+import argparse
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import chess
+import numpy as np
+import batch_eval
+import evaluation
+
+# Texel tuning of the piece values and piece-square tables. Labelled positions (a FEN or
+# EPD with the game result, e.g. 'rnbqkbnr/... w KQkq - c9 "1-0";' or '<fen> [0.5]') are
+# streamed from disk once into bitboard arrays, then every iteration scores all of them
+# with the batch evaluator and takes an Adam step down the gradient of
+#
+#   mean (result - 1 / (1 + 10 ** (-k * score / 400))) ** 2
+#
+# The data is split over a pool of processes, each computing the error and gradient of
+# its share. The state is checkpointed so long runs can be resumed with --resume.
+#
+#   python tuning.py quiet-labeled.epd --iterations 500 --workers 8
+
+RESULT_PATTERN = re.compile(r'"?(1-0|0-1|1/2-1/2)"?|\[(1\.0|0\.5|0\.0|1|0)\]')
+RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+PARSE_CHUNK = 100000  # positions converted to arrays at a time while reading the data
+EVAL_CHUNK = 8192  # positions unpacked to piece planes at a time in a worker
+
+DEFAULT_ITERATIONS = 300
+DEFAULT_LEARNING_RATE = 1.0
+CHECKPOINT_EVERY = 10
+
+# Parameter vector: values of pawn..queen (the king's cancels out), then the six tables
+VALUE_TYPES = [chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN]
+TABLES_OFFSET = len(VALUE_TYPES)
+MIRROR = np.array([chess.square_mirror(square) for square in chess.SQUARES])
+
+_masks = None  # per worker: memory-mapped bitboards and results of the data set
+_results = None
+
+
+# Function to split a data line into (placement field, White's result) or None
+def parse_line(line):
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    match = RESULT_PATTERN.search(line)
+    if match is None:
+        return None
+    result = RESULTS[match.group(1)] if match.group(1) else float(match.group(2))
+    return line.split()[0], result
+
+
+# Function to convert a labelled data file to <cache>.masks.npy and <cache>.results.npy,
+# reading it one chunk of lines at a time. Returns the number of positions.
+def prepare(data_path, cache):
+    masks_path, results_path = cache + ".masks.npy", cache + ".results.npy"
+    if (os.path.exists(masks_path) and os.path.exists(results_path)
+            and os.path.getmtime(masks_path) >= os.path.getmtime(data_path)):
+        return len(np.load(results_path, mmap_mode="r"))
+    mask_chunks, result_chunks = [], []
+    masks, results = [], []
+    with open(data_path) as f:
+        for line in f:
+            parsed = parse_line(line)
+            if parsed is None:
+                continue
+            masks.append(batch_eval.fen_bitboards(parsed[0]))
+            results.append(parsed[1])
+            if len(masks) == PARSE_CHUNK:
+                mask_chunks.append(np.array(masks, dtype=np.uint64))
+                result_chunks.append(np.array(results, dtype=np.float32))
+                masks, results = [], []
+    mask_chunks.append(np.array(masks, dtype=np.uint64).reshape(-1, 12))
+    result_chunks.append(np.array(results, dtype=np.float32))
+    np.save(masks_path, np.concatenate(mask_chunks))
+    np.save(results_path, np.concatenate(result_chunks))
+    return sum(len(chunk) for chunk in result_chunks)
+
+
+# Function to get the parameter vector of piece values and tables
+def params_vector(values, tables):
+    return np.array([values[piece_type] for piece_type in VALUE_TYPES] +
+                    [value for piece_type in chess.PIECE_TYPES for value in tables[piece_type]], dtype=np.float64)
+
+
+# Function to split a parameter vector back into (piece values, tables) of ints
+def params_from_vector(theta):
+    values = {piece_type: int(round(theta[i])) for i, piece_type in enumerate(VALUE_TYPES)}
+    values[chess.KING] = evaluation.PIECE_VALUES[chess.KING]
+    tables = {piece_type: [int(round(value)) for value in theta[TABLES_OFFSET + i * 64:TABLES_OFFSET + (i + 1) * 64]]
+              for i, piece_type in enumerate(chess.PIECE_TYPES)}
+    return values, tables
+
+
+# Function to turn a parameter vector into the 12 * 64 batch evaluator weights
+# (same layout as batch_eval.WEIGHTS: Black planes mirrored and negated)
+def weights(theta):
+    values = np.append(theta[:TABLES_OFFSET], evaluation.PIECE_VALUES[chess.KING])
+    tables = theta[TABLES_OFFSET:].reshape(6, 64)
+    white = values[:, None] + tables
+    black = -(values[:, None] + tables[:, MIRROR])
+    return np.concatenate([white, black]).reshape(-1)
+
+
+# Function to map a gradient on the weights back onto the parameter vector
+def params_gradient(weights_gradient):
+    white, black = weights_gradient.reshape(2, 6, 64)
+    tables = white.copy()
+    np.add.at(tables, (slice(None), MIRROR), -black)
+    values = (white.sum(axis=1) - black.sum(axis=1))[:TABLES_OFFSET]
+    return np.concatenate([values, tables.reshape(-1)])
+
+
+def _init_worker(cache):
+    global _masks, _results
+    _masks = np.load(cache + ".masks.npy", mmap_mode="r")
+    _results = np.load(cache + ".results.npy", mmap_mode="r")
+
+
+def _shard_error(start, end, weights_vector, k):
+    # Runs in a worker: summed squared error and its gradient on the weights for a slice of the data
+    error = 0.0
+    gradient = np.zeros(len(weights_vector))
+    scale = k * math.log(10) / 400
+    for i in range(start, end, EVAL_CHUNK):
+        j = min(end, i + EVAL_CHUNK)
+        planes = batch_eval.encode_bitboards(np.asarray(_masks[i:j])).reshape(j - i, -1).astype(np.float64)
+        scores = planes @ weights_vector
+        predicted = 1 / (1 + np.power(10.0, -k * scores / 400))
+        difference = np.asarray(_results[i:j], dtype=np.float64) - predicted
+        error += float(difference @ difference)
+        gradient += planes.T @ (-2 * difference * predicted * (1 - predicted) * scale)
+    return error, gradient
+
+
+class Tuner:
+    """Mean error and gradient of the data set, spread over worker processes."""
+
+    def __init__(self, cache, positions, workers=1):
+        self.positions = positions
+        step = -(-positions // workers)
+        self.shards = [(start, min(positions, start + step)) for start in range(0, positions, step)]
+        self.pool = None
+        if workers > 1:
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache,))
+        else:
+            _init_worker(cache)
+
+    def error(self, theta, k):
+        # Returns (mean error, gradient on the parameter vector)
+        weights_vector = weights(theta)
+        if self.pool is None:
+            parts = [_shard_error(start, end, weights_vector, k) for start, end in self.shards]
+        else:
+            futures = [self.pool.submit(_shard_error, start, end, weights_vector, k) for start, end in self.shards]
+            parts = [future.result() for future in futures]
+        error = sum(part[0] for part in parts) / self.positions
+        gradient = params_gradient(sum(part[1] for part in parts)) / self.positions
+        return error, gradient
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+# Function to find the k that fits the current parameters best (ternary search)
+def fit_k(tuner, theta, low=0.1, high=3.0, steps=20):
+    for _ in range(steps):
+        a = low + (high - low) / 3
+        b = high - (high - low) / 3
+        if tuner.error(theta, a)[0] < tuner.error(theta, b)[0]:
+            high = b
+        else:
+            low = a
+    return (low + high) / 2
+
+
+def save_checkpoint(path, state):
+    # Written to a temporary file first so an interrupted write never loses the last checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump({name: value.tolist() if isinstance(value, np.ndarray) else value
+                   for name, value in state.items()}, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path):
+    with open(path) as f:
+        state = json.load(f)
+    for name in ("theta", "m", "v"):
+        state[name] = np.array(state[name], dtype=np.float64)
+    return state
+
+
+# Function to run the tuning, returns the final state (theta, k, error, iteration)
+def tune(data_path, iterations=DEFAULT_ITERATIONS, learning_rate=DEFAULT_LEARNING_RATE, workers=1,
+         checkpoint=None, resume=False, cache=None):
+    cache = cache or os.path.splitext(data_path)[0]
+    positions = prepare(data_path, cache)
+    print(f"{positions} positions")
+    tuner = Tuner(cache, positions, workers)
+    try:
+        if resume and checkpoint and os.path.exists(checkpoint):
+            state = load_checkpoint(checkpoint)
+            print(f"Resuming at iteration {state['iteration']}, error {state['error']:.6f}")
+        else:
+            theta = params_vector(evaluation.PIECE_VALUES, evaluation.PIECE_SQUARE_TABLES)
+            k = fit_k(tuner, theta)
+            print(f"k = {k:.4f}")
+            state = {"iteration": 0, "k": k, "theta": theta, "m": np.zeros_like(theta),
+                     "v": np.zeros_like(theta), "error": tuner.error(theta, k)[0], "data": data_path}
+        beta1, beta2 = 0.9, 0.999
+        start = time.perf_counter()
+        while state["iteration"] < iterations:
+            error, gradient = tuner.error(state["theta"], state["k"])
+            state["iteration"] += 1
+            t = state["iteration"]
+            # Adam step
+            state["m"] = beta1 * state["m"] + (1 - beta1) * gradient
+            state["v"] = beta2 * state["v"] + (1 - beta2) * gradient ** 2
+            step = (state["m"] / (1 - beta1 ** t)) / (np.sqrt(state["v"] / (1 - beta2 ** t)) + 1e-12)
+            state["theta"] = state["theta"] - learning_rate * step
+            state["error"] = error
+            if t % CHECKPOINT_EVERY == 0 or t == iterations:
+                print(f"iteration {t} error {error:.6f} ({time.perf_counter() - start:.1f} s)", flush=True)
+                if checkpoint:
+                    save_checkpoint(checkpoint, state)
+        state["error"] = tuner.error(state["theta"], state["k"])[0]
+        state["positions"] = positions
+        return state
+    finally:
+        tuner.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Texel tuning of the evaluation parameters")
+    parser.add_argument("data", help="FEN/EPD positions labelled with the game result")
+    parser.add_argument("--output", default=evaluation.PARAMS_FILE, help="parameter file to write")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_LEARNING_RATE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoint", default="tuning.checkpoint.json")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint")
+    parser.add_argument("--cache", help="prefix of the converted data files, next to the data by default")
+    args = parser.parse_args()
+
+    state = tune(args.data, args.iterations, args.learning_rate, args.workers, args.checkpoint,
+                 args.resume, args.cache)
+    values, tables = params_from_vector(state["theta"])
+    evaluation.save_params(args.output, values, tables, data=os.path.basename(args.data),
+                           positions=state["positions"], iterations=state["iteration"], k=round(state["k"], 4),
+                           error=round(state["error"], 6), created=time.strftime("%Y-%m-%d %H:%M:%S"))
+    print(f"Error {state['error']:.6f}, parameters written to {args.output}")
@@ -0,0 +1,233 @@
+import sys
+import threading
+import chess
+from book import DEFAULT_BOOK, OpeningBook
+from chess_ai import MATE_SCORE, MAX_DEPTH, Search, iterative_deepening
+from tablebase import TABLEBASE
+from timecontrol import SearchLimits
+from transposition import DEFAULT_SIZE_MB, TranspositionTable
+
+# UCI front-end: reads commands from stdin and answers on stdout, so the engine can be
+# used from chess GUIs and match tools (cutechess-cli, fastchess, ...).
+#
+#   python uci.py
+
+ENGINE_NAME = "ChessAI"
+ENGINE_AUTHOR = "ogaber1 and maryamyasser33"
+
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+
+
+class UciEngine:
+    """UCI state: the current position, options, and the search thread.
+
+    The search runs on its own thread so stop, ponderhit and isready are answered
+    while it thinks. Output from both threads goes through send().
+    """
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.board = chess.Board()
+        self.tt = TranspositionTable(DEFAULT_SIZE_MB)
+        self.threads = 1
+        self.book = None  # OpeningBook when OwnBook is on
+        self.book_file = DEFAULT_BOOK
+        self.search = None
+        self.thread = None
+        # Set by stop/ponderhit; an infinite or ponder search keeps its bestmove until then
+        self.release = threading.Event()
+        self.pending_limits = None  # limits to apply on ponderhit
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line):
+        # Handles one command line, returns False on quit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_SIZE_MB} min 1 max {MAX_HASH_MB}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name Ponder type check default false")
+            self.send("option name OwnBook type check default false")
+            self.send(f"option name BookFile type string default {DEFAULT_BOOK}")
+            self.send("option name SyzygyPath type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.wait()
+            self.tt.clear()
+            self.board = chess.Board()
+        elif command == "setoption":
+            self.wait()
+            self.set_option(args)
+        elif command == "position":
+            self.wait()
+            self.set_position(args)
+        elif command == "go":
+            self.wait()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stop()
+            self.wait()
+            return False
+        elif command == "d":
+            self.send(str(self.board))
+            self.send(f"Fen: {self.board.fen()}")
+        return True
+
+    def set_option(self, args):
+        # setoption name <name> value <value>, names may contain spaces
+        if "name" not in args:
+            return
+        name_end = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:name_end]).lower()
+        value = " ".join(args[name_end + 1:])
+        try:
+            if name == "hash":
+                self.tt.resize(max(1, min(MAX_HASH_MB, int(value))))
+            elif name == "threads":
+                self.threads = max(1, min(MAX_THREADS, int(value)))
+            elif name == "ownbook":
+                self.set_book(value.lower() == "true", self.book_file)
+            elif name == "bookfile":
+                self.set_book(self.book is not None, value)
+            elif name == "syzygypath":
+                TABLEBASE.configure(value)
+                self.send(f"info string {len(TABLEBASE.tables.wdl)} tablebases, up to {TABLEBASE.max_pieces} pieces")
+        except (ValueError, OSError):
+            self.send(f"info string invalid value for {name}: {value}")
+
+    def set_book(self, enabled, path):
+        if self.book is not None:
+            self.book.close()
+        self.book_file = path
+        self.book = OpeningBook(path) if enabled else None
+
+    def set_position(self, args):
+        # position startpos|fen <fen> [moves <move>...]
+        moves_at = args.index("moves") if "moves" in args else len(args)
+        try:
+            if args and args[0] == "fen":
+                board = chess.Board(" ".join(args[1:moves_at]))
+            else:
+                board = chess.Board()
+            for uci in args[moves_at + 1:]:
+                board.push_uci(uci)
+        except ValueError as e:
+            self.send(f"info string invalid position: {e}")
+            return
+        self.board = board
+
+    def go(self, args):
+        values = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            name = args[i]
+            if name in ("infinite", "ponder"):
+                flags.add(name)
+                i += 1
+            elif name in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes"):
+                try:
+                    values[name] = int(args[i + 1])
+                except (IndexError, ValueError):
+                    pass
+                i += 2
+            else:
+                i += 1  # searchmoves and mate are not supported
+        # UCI times are in milliseconds, SearchLimits wants seconds
+        for name in ("movetime", "wtime", "btime", "winc", "binc"):
+            if name in values:
+                values[name] /= 1000
+        if self.book is not None and not flags:
+            move = self.book.choose(self.board)
+            if move is not None:
+                self.send(f"bestmove {move.uci()}")
+                return
+        limits = SearchLimits(**values)
+        depth = values.get("depth", MAX_DEPTH)
+        self.release.clear()
+        self.pending_limits = None
+        if "ponder" in flags:
+            # Search without limits until ponderhit hands over the real ones
+            self.pending_limits = limits
+            limits = SearchLimits(depth=values.get("depth"))
+        self.search = Search(limits)
+        wait_for_release = bool(flags)
+        self.thread = threading.Thread(target=self.run_search,
+                                       args=(self.board.copy(), depth, self.search, wait_for_release), daemon=True)
+        self.thread.start()
+
+    def run_search(self, board, depth, search, wait_for_release):
+        move = iterative_deepening(board, depth, tt=self.tt, search=search, workers=self.threads,
+                                   on_iteration=lambda stats: self.send(info_line(stats, board.turn, self.tt.usage())))
+        if wait_for_release:
+            # UCI: after go infinite or go ponder the bestmove waits for stop/ponderhit
+            self.release.wait()
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        line = f"bestmove {move.uci()}"
+        pv = search.iterations[-1].pv if search.iterations else []
+        if len(pv) > 1 and pv[0] == move:
+            line += f" ponder {pv[1].uci()}"
+        self.send(line)
+
+    def stop(self):
+        search = self.search
+        if search is not None:
+            search.stop()
+        self.release.set()
+
+    def ponderhit(self):
+        search = self.search
+        if search is None:
+            return
+        if self.pending_limits is not None:
+            search.set_limits(self.pending_limits, self.board.turn)
+            self.pending_limits = None
+        self.release.set()
+
+    def wait(self):
+        # Commands that change the engine state wait for the running search first
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def info_line(stats, turn, hashfull):
+    # Scores in the search are from White's point of view, UCI wants the side to move
+    score = stats.score if turn == chess.WHITE else -stats.score
+    if abs(score) >= MATE_SCORE:
+        moves = (len(stats.pv) + 1) // 2 or 1
+        score_text = f"mate {moves if score > 0 else -moves}"
+    else:
+        score_text = f"cp {int(score)}"
+    pv = " ".join(move.uci() for move in stats.pv)
+    return (f"info depth {stats.depth} score {score_text} nodes {stats.nodes} nps {stats.nps} "
+            f"time {int(stats.elapsed * 1000)} hashfull {hashfull} tbhits {stats.tb_hits} pv {pv}")
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+
+
+if __name__ == "__main__":
+    main()